@@ -0,0 +1,254 @@
+import re
+import logging
+import threading
+
+from peewee import fn
+
+from .custommodels import BlacklistRule
+
+
+LOG = logging.getLogger(__name__)
+
+KINDS = ('subreddit', 'user', 'url')
+
+
+def valid_rule(kind, value):
+	"""
+	Check that a rule can't block every post.
+
+	Args:
+		kind (String): One of `KINDS`
+		value (String):
+	Returns:
+		Boolean
+	"""
+	if kind == 'url':
+		return _valid_url_pattern(value)
+	return bool(value)
+
+
+def _valid_url_pattern(pattern):
+	# Without any literal characters, the pattern matches the empty string.
+	return bool(pattern.replace('*', '').strip())
+
+
+class Blacklist(object):
+	"""
+	An immutable set of blacklist rules that posts are checked against.
+
+	Subreddits and users are kept in sets, and every url pattern is combined
+	into a single regex, so checking a post costs about the same no matter
+	how many rules there are. Names are compared case-insensitively.
+
+	Url patterns are matched anywhere in the text of a post. `*` matches any
+	run of characters that aren't whitespace, e.g. `*.craigslist.org/about`.
+	Patterns made only of `*` would match every post, so they are ignored.
+
+	Kwargs:
+		subreddits (Iterable): Subreddit names
+		users (Iterable): Usernames
+		url_patterns (Iterable): Url or domain patterns
+	"""
+	def __init__(self, subreddits=(), users=(), url_patterns=()):
+		super(Blacklist, self).__init__()
+		self.subreddits = frozenset(name.lower() for name in subreddits)
+		self.users = frozenset(name.lower() for name in users)
+		self.url_patterns = tuple(sorted(set(filter(_valid_url_pattern, url_patterns))))
+		self._url_matcher = self._compile(self.url_patterns)
+
+	@classmethod
+	def from_rules(cls, rules):
+		"""
+		Args:
+			rules (Iterable): (kind, value) tuples
+		Returns:
+			Blacklist
+		"""
+		values = {kind: [] for kind in KINDS}
+		for kind, value in rules:
+			values[kind].append(value)
+		return cls(values['subreddit'], values['user'], values['url'])
+
+	def blocks(self, post):
+		"""
+		Check whether a post should be ignored.
+
+		Meant to be called before any urls are extracted from the post, so
+		blacklisted posts cost as little as possible.
+
+		Args:
+			post (RedditPost):
+		Returns:
+			Boolean
+		"""
+		if post.subreddit is not None and post.subreddit.lower() in self.subreddits:
+			return True
+		if post.author is not None and post.author.lower() in self.users:
+			return True
+		if self._url_matcher is not None and self._url_matcher.search(post.text):
+			return True
+		return False
+
+	def __len__(self):
+		return len(self.subreddits) + len(self.users) + len(self.url_patterns)
+
+	def _compile(self, patterns):
+		if not patterns:
+			return None
+		alternatives = [re.escape(pattern).replace(r'\*', r'\S*') for pattern in patterns]
+		# Longest first, so the alternation doesn't stop at a shorter prefix.
+		alternatives.sort(key=len, reverse=True)
+		return re.compile('|'.join(alternatives), re.IGNORECASE)
+
+
+class DatabaseRules(object):
+	"""
+	Blacklist rules stored in the database as `BlacklistRule`s.
+
+	Values are stored lowercase, and removed regardless of case, the same
+	way `Blacklist` matches them.
+	"""
+	def load(self):
+		return [(rule.kind, rule.value) for rule in BlacklistRule.select()]
+
+	def add(self, kind, value):
+		BlacklistRule.get_or_create(kind=kind, value=value.lower())
+
+	def remove(self, kind, value):
+		query = BlacklistRule.delete().where(
+			(BlacklistRule.kind == kind) & (fn.Lower(BlacklistRule.value) == value.lower()))
+		query.execute()
+
+
+class FileRules(object):
+	"""
+	Blacklist rules stored in a text file.
+
+	One rule per line, made up of the kind and the value. Blank lines and
+	lines starting with `#` are ignored. Added values are written lowercase,
+	and removed regardless of case, the same way `Blacklist` matches them.
+
+		# no archiving in these subs
+		subreddit AskReddit
+		user someone
+		url *.craigslist.org/about
+
+	Args:
+		path (String): The path to the rules file. It doesn't have to exist
+			until a rule is added.
+	"""
+	def __init__(self, path):
+		super(FileRules, self).__init__()
+		self.path = path
+
+	def load(self):
+		try:
+			with open(self.path, 'r') as f:
+				lines = f.read().splitlines()
+		except FileNotFoundError:
+			return []
+		rules = []
+		for line in lines:
+			line = line.strip()
+			if not line or line.startswith('#'):
+				continue
+			kind, _, value = line.partition(' ')
+			if kind not in KINDS or not valid_rule(kind, value.strip()):
+				LOG.warning('Ignoring invalid blacklist rule: {}'.format(line))
+				continue
+			rules.append((kind, value.strip()))
+		return rules
+
+	def add(self, kind, value):
+		value = value.lower()
+		if (kind, value) not in [(k, v.lower()) for k, v in self.load()]:
+			with open(self.path, 'a') as f:
+				f.write('{} {}\n'.format(kind, value))
+
+	def remove(self, kind, value):
+		value = value.lower()
+		rules = [(k, v) for k, v in self.load() if (k, v.lower()) != (kind, value)]
+		with open(self.path, 'w') as f:
+			f.writelines('{} {}\n'.format(*rule) for rule in rules)
+
+
+class BlacklistManager(object):
+	"""
+	Keeps the current Blacklist, and replaces it whenever the rules change.
+
+	Rules can be changed by sending the bot a message, one command per line:
+
+		blacklist subreddit AskReddit
+		unblacklist user someone
+		blacklist url *.craigslist.org/about
+
+	Admins can run any command. Anyone else can only blacklist (or
+	unblacklist) their own username, so users can opt out of the bot.
+
+	A new Blacklist is built on every reload and swapped in all at once, so
+	`blacklist` can be read from any thread without locking and no restart
+	is needed.
+
+	Args:
+		rules ([DatabaseRules, FileRules]): Where the rules are stored
+	Kwargs:
+		admins (Iterable): Usernames allowed to change any rule
+	"""
+	command_regex = re.compile(r'^\s*(blacklist|unblacklist)\s+(subreddit|user|url)\s+(\S+)\s*$', re.I | re.M)
+
+	def __init__(self, rules, admins=()):
+		super(BlacklistManager, self).__init__()
+		self.rules = rules
+		self.admins = frozenset(name.lower() for name in admins)
+		self._lock = threading.Lock()
+		self.blacklist = Blacklist()
+		self.reload()
+
+	def blocks(self, post):
+		"""See `Blacklist.blocks`"""
+		return self.blacklist.blocks(post)
+
+	def reload(self):
+		"""Reload every rule from storage."""
+		with self._lock:
+			blacklist = Blacklist.from_rules(self.rules.load())
+			self.blacklist = blacklist
+		LOG.info('Blacklist loaded with {} rules'.format(len(blacklist)))
+
+	def handle_message(self, message):
+		"""
+		Apply any blacklist commands found in a message sent to the bot.
+
+		Args:
+			message (praw.models.Message):
+		Returns:
+			List
+
+			The (command, kind, value) tuples that were applied.
+		"""
+		sender = str(message.author).lower() if message.author is not None else None
+		applied = []
+		for command, kind, value in self.command_regex.findall(message.body):
+			command, kind = command.lower(), kind.lower()
+			if not self._allowed(sender, kind, value):
+				LOG.warning('{} is not allowed to {} {} {}'.format(sender, command, kind, value))
+				continue
+			if command == 'blacklist' and not valid_rule(kind, value):
+				LOG.warning('Ignoring invalid blacklist rule from {}: {} {}'.format(sender, kind, value))
+				continue
+			if command == 'blacklist':
+				self.rules.add(kind, value)
+			else:
+				self.rules.remove(kind, value)
+			applied.append((command, kind, value))
+		if applied:
+			LOG.info('Blacklist changed by {}: {}'.format(sender, applied))
+			self.reload()
+		return applied
+
+	def _allowed(self, sender, kind, value):
+		if sender is None:
+			return False
+		if sender in self.admins:
+			return True
+		return kind == 'user' and value.lower() == sender
@@ -1,9 +1,13 @@
 import re
+import time
 import logging
 
-import requests
-
 from .errors import PageNotFoundError, PageUnavailableError
+from .lazy import lazy_import
+from .memory import ByteBoundedCache
+
+
+requests = lazy_import('requests')
 
 
 LOG = logging.getLogger(__name__)
@@ -23,18 +27,41 @@ def extract_urls(post):
 	return re.findall(r'[\w\.:/]+?craigslist.org.+?.*?\.html', post)
 
 
-def request_page(url):
+_SESSION = None
+
+
+def get_session():
+	"""
+	Get the http session shared by everything in this process.
+
+	Reusing one session keeps connections to Craigslist open between
+	requests instead of reconnecting for every page.
+
+	Returns:
+		requests.Session
+	"""
+	global _SESSION
+	if _SESSION is None:
+		_SESSION = requests.Session()
+	return _SESSION
+
+
+def request_page(url, session=None):
 	"""
 	Get the html source of a webpage.
 
 	Args:
 		url (String):
+	Kwargs:
+		session (requests.Session): Session to make the request with. See
+			`get_session`.
 	Returns:
 		String
 
 		The HTML source of the given url
 	"""
-	r = requests.get(url)
+	get = session.get if session is not None else requests.get
+	r = get(url)
 	if r.ok:
 		LOG.info('Page requested: {}'.format(url))
 		return r.text
@@ -57,6 +84,10 @@ class RedditPost(object):
 	properties can be merged for easier usage within the bot (such as
 	`submission.selftext` and `comment.body` can be merged into `post.text`.
 
+	`subreddit` and `author` are plain names. `author` is None if the
+	account has been deleted. `thread_id` is the id of the submission a
+	post belongs to, which for a submission is its own id.
+
 	Args:
 		post ([praw.models.Submission, praw.models.Comment]):
 	"""
@@ -68,6 +99,26 @@ class RedditPost(object):
 		else:
 			text = self._parse_comment(post)
 		self.text = text
+		self.subreddit = str(post.subreddit)
+		self.author = str(post.author) if post.author is not None else None
+		self.thread_id = self._parse_thread_id(post)
+
+	@property
+	def fullname(self):
+		"""The Reddit fullname of the post, e.g. `t3_abc123`"""
+		return self._original_post.fullname
+
+	@property
+	def created(self):
+		"""The unix time the post was created"""
+		return self._original_post.created_utc
+
+	@property
+	def thread_created(self):
+		"""The unix time the thread (submission) the post is in was created"""
+		if self._is_submission(self._original_post):
+			return self._original_post.created_utc
+		return self._original_post.submission.created_utc
 
 	def _parse_submission(self, post):
 		return post.selftext
@@ -75,6 +126,12 @@ class RedditPost(object):
 	def _parse_comment(self, post):
 		return post.body
 
+	def _parse_thread_id(self, post):
+		if self._is_submission(post):
+			return str(post.id)
+		# `link_id` is the fullname of the submission, i.e. `t3_abc123`
+		return str(post.link_id).split('_', 1)[-1]
+
 	def _is_submission(self, post):
 		return 'comment_sort' in vars(post)
 
@@ -107,30 +164,116 @@ class PostFormatter(object):
 		'***\n\n'
 		'[^github](https://github.com/darricktheprogrammer/reddit-cl-bot) ^| [^send ^message/report](/#)'
 		)
+	# Used instead of `default_format` when a post links to several ads.
+	# %SECTIONS% is filled with one `section_format` per ad.
+	multiple_format = (
+		'These Craigslist posts have been archived so they can continue to be viewed after expiration.\n\n'
+		'%SECTIONS%\n\n'
+		'***\n\n'
+		'[^github](https://github.com/darricktheprogrammer/reddit-cl-bot) ^| [^send ^message/report](/#)'
+		)
+	section_format = (
+		'%ORIGINALPOST% | %IMGURALBUM% | %SCREENSHOT%\n\n'
+		'%QUOTEDSECTION%'
+		)
+	# Reddit won't accept a comment longer than this.
+	max_length = 10000
 
 	def __init__(self):
 		super(PostFormatter, self).__init__()
 		# init can be changed later to accept different formats
 		self._fmt = self.default_format
+		self._multiple_fmt = self.multiple_format
+		self._section_fmt = self.section_format
 
 	def format(self, archive):
+		return self.format_many([archive])
+
+	def format_many(self, archives):
+		"""
+		Format one reply for every archive found in a post.
+
+		Each archive gets its own section. See `format_fitting` for how the
+		reply is kept short enough for a comment.
+
+		Args:
+			archives (List): One or more archives
+		Returns:
+			String
+		"""
+		reply, _ = self.format_fitting(archives)
+		return reply
+
+	def format_fitting(self, archives):
+		"""
+		Format as many of `archives` as fit in one comment.
+
+		If the reply would be too long, the ad bodies are all shortened by
+		the same share until it fits. If even that isn't enough, archives are
+		left off the end, and then image lists are cut short, with the rest
+		left to the imgur album.
+
+		Args:
+			archives (List): One or more archives
+		Returns:
+			Tuple
+
+			(reply, the archives included in it). Archives that were left off
+			need a reply of their own.
+		"""
+		bodies = [archive.ad.body for archive in archives]
+		reply = self._format_archives(archives, bodies)
+		while len(reply) > self.max_length and any(bodies):
+			overflow = len(reply) - self.max_length
+			total = sum(len(body) for body in bodies)
+			bodies = [
+				self._shorten(body, len(body) - -(-overflow * len(body) // total))
+				for body in bodies
+				]
+			reply = self._format_archives(archives, bodies)
+		if len(reply) > self.max_length and len(archives) > 1:
+			return self.format_fitting(archives[:-1])
+		image_limit = max(len(archive.images) for archive in archives)
+		while len(reply) > self.max_length and image_limit > 0:
+			image_limit = min(image_limit - 1, image_limit * self.max_length // len(reply))
+			reply = self._format_archives(archives, bodies, image_limit)
+		return reply, archives
+
+	def _format_archives(self, archives, bodies, image_limit=None):
+		if len(archives) == 1:
+			return self._fill(self._fmt, archives[0], bodies[0], image_limit)
+		sections = [
+			self._fill(self._section_fmt, archive, body, image_limit)
+			for archive, body in zip(archives, bodies)
+			]
+		return self._multiple_fmt.replace('%SECTIONS%', '\n\n'.join(sections))
+
+	def _fill(self, fmt, archive, ad_body, image_limit=None):
 		ad_title = self._h3(archive.ad.title)
 		original_post = self._format_link('original post', archive.ad.url)
 		album = self._format_link('imgur album', archive.url)
 		screenshot = self._format_link('screenshot', archive.screenshot)
-		ad_body = archive.ad.body
-		images = self._format_link_list(archive.images)
-		quoted_section = [ad_title, ad_body]
+		images = self._format_link_list(archive.images, image_limit)
+		quoted_section = [ad_title]
+		if ad_body:
+			quoted_section.append(ad_body)
 		if images:
 			quoted_section.append(images)
 		quoted_section = self._quote('\n\n'.join(quoted_section))
 
-		reply = self._fmt.replace('%ORIGINALPOST%', original_post)
+		reply = fmt.replace('%ORIGINALPOST%', original_post)
 		reply = reply.replace('%IMGURALBUM%', album)
 		reply = reply.replace('%SCREENSHOT%', screenshot)
 		reply = reply.replace('%QUOTEDSECTION%', quoted_section)
 		return reply
 
+	def _shorten(self, text, length):
+		if length <= 0:
+			return ''
+		if len(text) <= length:
+			return text
+		return text[:length - 1].rstrip() + '\u2026'
+
 	def _replace(self, original, placeholder, newtext):
 		return original.replace(placeholder, newtext)
 
@@ -144,9 +287,101 @@ class PostFormatter(object):
 	def _h3(self, text):
 		return '### {} ###'.format(text)
 
-	def _format_link_list(self, images):
+	def _format_link_list(self, images, limit=None):
 		markdown_images = []
-		for i, image in enumerate(images):
+		for i, image in enumerate(images[:limit]):
 			markdown_link = self._format_link('image {}'.format(i + 1), image)
 			markdown_images.append(markdown_link)
+		if limit is not None and len(images) > limit:
+			markdown_images.append('{} more in the album'.format(len(images) - limit))
 		return ' | '.join(markdown_images)
+
+
+class ReplyCoalescer(object):
+	"""
+	Combines every archive found in a post into a single reply.
+
+	A post that links several ads gets one reply with a section per ad,
+	rather than a reply per ad. Each thread is also only told about an ad
+	once per `window`, so several comments in the same thread linking the
+	same ad don't each get a reply.
+
+	Kwargs:
+		formatter (PostFormatter):
+		window (Float): Seconds during which a thread won't be replied to
+			again for the same ad.
+		clock (Callable): Returns the current time in seconds
+		max_bytes (Int): The most memory used to remember answered ads.
+			Past it, the oldest are forgotten early.
+	"""
+	def __init__(self, formatter=None, window=24 * 60 * 60, clock=time.time, max_bytes=4 * 1024 * 1024):
+		super(ReplyCoalescer, self).__init__()
+		self.formatter = formatter or PostFormatter()
+		self.window = window
+		self._clock = clock
+		# (thread id, ad post id) => time answered, oldest first
+		self._answered = ByteBoundedCache(max_bytes)
+
+	def coalesce(self, post, archives):
+		"""
+		Build the reply for a post, leaving out ads the thread already has.
+
+		The ads in the reply are counted as answered straight away. Ads that
+		didn't fit in the reply are not, so calling `coalesce` again with the
+		same archives builds a follow-up reply with the rest (see
+		`coalesce_all`).
+
+		Args:
+			post (RedditPost):
+			archives (List): Every archive found in the post
+		Returns:
+			String
+
+			The reply, or None if there is nothing new to reply with.
+		"""
+		now = self._clock()
+		self._expire(now)
+		fresh = []
+		keys = []
+		for archive in archives:
+			key = (post.thread_id, archive.ad.post_id)
+			if key in self._answered or key in keys:
+				continue
+			keys.append(key)
+			fresh.append(archive)
+		if not fresh:
+			LOG.info('Thread {} already has a reply for every ad'.format(post.thread_id))
+			return None
+		reply, included = self.formatter.format_fitting(fresh)
+		for key in keys[:len(included)]:
+			self._answered[key] = now
+		return reply
+
+	def coalesce_all(self, post, archives):
+		"""
+		Build every reply needed to cover all the new ads in a post.
+
+		Usually one reply, but a post linking more ads than fit in a single
+		comment gets follow-up replies for the rest.
+
+		Args:
+			post (RedditPost):
+			archives (List): Every archive found in the post
+		Returns:
+			List
+
+			Reply strings, empty if there is nothing new to reply with.
+		"""
+		replies = []
+		reply = self.coalesce(post, archives)
+		while reply is not None:
+			replies.append(reply)
+			reply = self.coalesce(post, archives)
+		return replies
+
+	def _expire(self, now):
+		while self._answered:
+			key, answered = next(iter(self._answered.items()))
+			if now - answered < self.window:
+				break
+			del self._answered[key]
@@ -1,27 +1,47 @@
 import re
-
-from bs4 import BeautifulSoup
-from html2text import html2text
+import json
 
 from .custommodels import CraigslistAd
 from .errors import InvalidIdException
+from .lazy import lazy_import
+
+
+bs4 = lazy_import('bs4')
+html2text = lazy_import('html2text')
+
+IMAGE_URL = 'https://images.craigslist.org/{}_{}.jpg'
+FULL_SIZE = '1200x900'
 
 
-def scrape_page(html):
+def scrape_page(html, full_size=False):
 	"""
 	Scrape the html of a Craigslist posting for desired information.
 
-	Images are only the 600x450 resolution version, not full size. Craigslist
-	uses javascript to load the full size image link on rollover of the
-	thumbnail. This makes it difficult and slow to retrieve the full size link.
+	By default, images are only the 600x450 resolution version, not full
+	size. Craigslist uses javascript to load the full size image link on
+	rollover of the thumbnail, but every image id is already in the page, in
+	the `imgList` script and the thumbnail links. With `full_size`, the full
+	size urls are built from those ids, without any extra requests. If the
+	ids can't be found, the 600x450 images are used instead.
 
 	Args:
 		html (String): The html source of the craigslist posting
+	Kwargs:
+		full_size (Boolean): Get full size images instead of 600x450
 	Returns:
 		BaseCraigslistAd
 	"""
-	soup = BeautifulSoup(html, 'html.parser')
+	soup = bs4.BeautifulSoup(html, 'html.parser')
+	try:
+		return _scrape(html, soup, full_size)
+	finally:
+		# Soup trees are full of reference cycles (parent <=> child), so left
+		# alone they wait for the cycle collector. Breaking them up frees the
+		# tree straight away.
+		soup.decompose()
 
+
+def _scrape(html, soup, full_size):
 	# "postinginfo reveal" class gets put in front of "postinginfo", so even
 	# though the post id paragraph comes first, it is at index 1 once parsed
 	# by BeautifulSoup.
@@ -32,21 +52,50 @@ def scrape_page(html):
 	url = soup.find('link', rel='canonical').get('href')
 	body = soup.find('section', id='postingbody').contents[2:]
 	body = '\n'.join([str(line) for line in body]).strip()
-	body = html2text(body)
-
-	# Covers all three cases of no image, single image, or multiple images.
-	links = [link.get('href') for link in soup.find_all('a')]
-	images = [img.get('src') for img in soup.find_all('img')]
-	links.extend(images)
-	# `set` to remove duplicates.
-	# `str` to turn `None` into an iterable so comparison doesn't fail.
-	images = list(set([link for link in links if '600x450' in str(link)]))
+	body = html2text.html2text(body)
+
+	images = _full_size_images(html, soup) if full_size else []
+	if not images:
+		# Covers all three cases of no image, single image, or multiple images.
+		links = [link.get('href') for link in soup.find_all('a')]
+		images = [img.get('src') for img in soup.find_all('img')]
+		links.extend(images)
+		# `set` to remove duplicates.
+		# `str` to turn `None` into an iterable so comparison doesn't fail.
+		images = list(set([link for link in links if '600x450' in str(link)]))
 	return CraigslistAd(
 		title=title, post_id=post_id, url=url,
 		body=body, images=images
 		)
 
 
+def _full_size_images(html, soup):
+	"""
+	Build the full size image urls from the image ids found in the page.
+
+	Image urls look like `https://images.craigslist.org/$ID_600x450.jpg`, and
+	every size of an image uses the same id.
+	"""
+	ids = []
+	# `var imgList = [{"imgid": "1:00303_hvg2dCTqGMm", ...}, ...];`
+	match = re.search(r'imgList\s*=\s*(\[.*?\]);', html)
+	if match:
+		try:
+			ids = [image['imgid'].split(':')[-1] for image in json.loads(match.group(1))]
+		except (ValueError, KeyError, TypeError, AttributeError):
+			ids = []
+	if not ids:
+		thumbs = [a.get('href') for a in soup.find_all('a', class_='thumb')]
+		ids = [m.group(1) for m in map(_image_id, thumbs) if m]
+	# Remove duplicates, but keep the order of the page.
+	ids = list(dict.fromkeys(ids))
+	return [IMAGE_URL.format(image_id, FULL_SIZE) for image_id in ids]
+
+
+def _image_id(url):
+	return re.search(r'images\.craigslist\.org/(\w+?)_\d+x\d+\w*\.jpg', url or '')
+
+
 def id_from_url(url):
 	"""
 	Retrieve the Craigslist post id from the url.
@@ -1,6 +1,11 @@
 import re
+import threading
+from contextlib import contextmanager
 
-from peewee import SqliteDatabase, Model, CharField, ForeignKeyField, TextField
+from peewee import (
+	SqliteDatabase, Model, CharField, ForeignKeyField, TextField,
+	FloatField, IntegerField
+	)
 
 from .errors import InvalidImagePathException
 
@@ -9,6 +14,32 @@ from .errors import InvalidImagePathException
 # defined at runtime.
 DATABASE = SqliteDatabase(None)
 
+_TRUSTED = threading.local()
+
+
+@contextmanager
+def trusted_load():
+	"""
+	Skip image path validation while loading ads from our own database.
+
+	Images are validated before an ad is saved, so there is no need to check
+	them again for every row loaded back out of the database.
+
+	Usage:
+		with trusted_load():
+			ads = list(CraigslistAd.select())
+	"""
+	previous = getattr(_TRUSTED, 'active', False)
+	_TRUSTED.active = True
+	try:
+		yield
+	finally:
+		_TRUSTED.active = previous
+
+
+def _is_trusted():
+	return getattr(_TRUSTED, 'active', False)
+
 
 class ImageListField(CharField):
 	"""
@@ -54,6 +85,9 @@ class BaseCraigslistAd(CustomModel):
 	"""
 	# Match anything. Let subclasses worry about their own matching.
 	image_path_regex = '.*'
+	# Compiled `image_path_regex` match functions, keyed by pattern, so each
+	# pattern is only compiled once no matter how many ads are created.
+	_image_path_validators = {}
 	title = CharField()
 	post_id = CharField(index=True, max_length=10)
 	url = CharField()
@@ -62,8 +96,8 @@ class BaseCraigslistAd(CustomModel):
 
 	def __init__(self, *args, **kwargs):
 		super(BaseCraigslistAd, self).__init__(*args, **kwargs)
-		for image in self.images:
-			self._validate_image_path(image)
+		if not _is_trusted():
+			self.validate_many(self.images)
 
 	@property
 	def images(self):
@@ -71,10 +105,38 @@ class BaseCraigslistAd(CustomModel):
 
 	@images.setter
 	def images(self, value):
-		for image in value:
-			self._validate_image_path(image)
+		if not _is_trusted():
+			self.validate_many(value)
 		self._images = value
 
+	@classmethod
+	def validate_many(cls, paths):
+		"""
+		Validate a list of image paths against `image_path_regex`.
+
+		Args:
+			paths (List): The paths to validate
+		Returns:
+			Void
+		Raises:
+			InvalidImagePathException
+		"""
+		match = cls._image_path_validator()
+		if all(map(match, paths)):
+			return
+		invalid = [pth for pth in paths if not match(pth)]
+		msg = 'Invalid image paths for {}: {}'.format(cls.__name__, invalid)
+		raise InvalidImagePathException(msg)
+
+	@classmethod
+	def _image_path_validator(cls):
+		try:
+			return cls._image_path_validators[cls.image_path_regex]
+		except KeyError:
+			match = re.compile(cls.image_path_regex).match
+			cls._image_path_validators[cls.image_path_regex] = match
+			return match
+
 	def _validate_image_path(self, pth):
 		"""
 		Validate the path to an image as necessary for each subclass.
@@ -91,8 +153,8 @@ class BaseCraigslistAd(CustomModel):
 		Raises:
 			InvalidImagePathException
 		"""
-		if not re.match(self.image_path_regex, pth):
-			raise InvalidImagePathException
+		if not self._image_path_validator()(pth):
+			raise InvalidImagePathException(pth)
 
 
 class CraigslistAd(BaseCraigslistAd):
@@ -133,3 +195,83 @@ class Archive(CustomModel):
 		# The ad must be saved first, otherwise the ForeignKey points to nothing
 		self.ad.save(*args, **kwargs)
 		return super(Archive, self).save(*args, **kwargs)
+
+
+class ImageUpload(CustomModel):
+	"""
+	Record of a single image that has been uploaded to Imgur.
+
+	Uploads are recorded as each one finishes, so that an archive interrupted
+	part way through (crash, rate limit, etc.) can be resumed without
+	uploading the same image twice.
+
+	Args:
+		post_id (String): The id of the Craigslist ad the image belongs to
+		position (Int): The image's place in the album, 0 being the
+			screenshot. Uploads are resumed by position, since local paths
+			(screenshots especially) change between attempts.
+		path (String): The local path of the uploaded image
+		link (String): Direct url to the image on Imgur
+		deletehash (String): The Imgur deletehash of the image. Anonymous
+			albums are built from deletehashes rather than image ids.
+	"""
+	post_id = CharField(index=True, max_length=10)
+	position = IntegerField()
+	path = CharField()
+	link = CharField()
+	deletehash = CharField()
+
+
+class BlacklistRule(CustomModel):
+	"""
+	A single blacklist rule.
+
+	Args:
+		kind (String): What the rule applies to. One of `subreddit`, `user`
+			or `url`.
+		value (String): The subreddit name, username or url pattern
+	"""
+	kind = CharField(max_length=10)
+	value = CharField()
+
+	class Meta:
+		indexes = (
+			(('kind', 'value'), True),
+			)
+
+
+class OutboxReply(CustomModel):
+	"""
+	A reply waiting to be posted to Reddit.
+
+	Replies are saved here first and posted later by a `ReplyScheduler`, so
+	they survive restarts and Reddit's rate limits never hold up archiving.
+
+	Args:
+		fullname (String): The fullname of the submission or comment being
+			replied to (`t3_...` or `t1_...`).
+		thread_id (String): The id of the submission the reply is in
+		body (String): Markdown formatted text of the reply
+		priority (Float): Replies with a higher priority are posted first
+	Kwargs:
+		status (String): `pending`, `sent`, or `dead` once it has failed too
+			many times.
+		attempts (Int): The number of failed attempts so far
+		next_attempt (Float): Unix time before which the reply won't be
+			tried again.
+		last_error (String): The most recent error
+		reply_id (String): The fullname of the posted reply, once sent
+	"""
+	fullname = CharField(index=True)
+	thread_id = CharField()
+	body = TextField()
+	priority = FloatField(default=0)
+	status = CharField(default='pending', index=True)
+	attempts = IntegerField(default=0)
+	next_attempt = FloatField(default=0)
+	last_error = TextField(default='')
+	reply_id = CharField(default='')
+
+
+# Every model stored in `DATABASE`, for creating the schema in one go.
+MODELS = [CraigslistAd, AdCache, Archive, ImageUpload, BlacklistRule, OutboxReply]
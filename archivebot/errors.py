@@ -12,3 +12,15 @@ class PageNotFoundError(Exception):
 
 class PageUnavailableError(Exception):
 	pass
+
+
+class ImgurUploadError(Exception):
+	pass
+
+
+class RateLimitError(Exception):
+	pass
+
+
+class SnapshotTimeoutError(Exception):
+	pass
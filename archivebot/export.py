@@ -0,0 +1,203 @@
+"""
+Streaming export of the archive, for researchers and moderators.
+
+Rows are read in fixed-size chunks by id, as plain tuples rather than model
+instances, so memory use stays the same however big the archive gets. Each
+export returns the id of the last row written, which can be passed back as
+`since_id` (or kept in a watermark file) so the next export only contains
+new archives:
+
+	python -m archivebot.export archive.db archive-$(date +%F).jsonl.gz --watermark export.watermark
+	python -m archivebot.export archive.db archive.parquet --format parquet
+"""
+import sys
+import gzip
+import json
+import logging
+import argparse
+
+from .custommodels import DATABASE, Archive, CraigslistAd
+
+
+LOG = logging.getLogger(__name__)
+
+FORMATS = ('jsonl', 'parquet')
+COLUMNS = (
+	'id', 'url', 'title', 'screenshot', 'images',
+	'post_id', 'ad_title', 'ad_url', 'ad_body', 'ad_images',
+	)
+# Columns stored as lists of urls
+LIST_COLUMNS = ('images', 'ad_images')
+
+
+def iter_chunks(since_id=0, chunk_size=1000, models=None):
+	"""
+	Read archives, along with their ads, a chunk at a time.
+
+	Kwargs:
+		since_id (Int): Only archives with a higher id are read
+		chunk_size (Int): The number of rows in each chunk
+		models (Object): Anything with `Archive` and `CraigslistAd` models,
+			such as a `sharding.Shard`. Defaults to the models in
+			`custommodels`.
+	Returns:
+		Generator
+
+		Lists of row dicts, keyed by `COLUMNS`, in id order.
+	"""
+	archive = models.Archive if models is not None else Archive
+	ad = models.CraigslistAd if models is not None else CraigslistAd
+	fields = (
+		archive.id, archive.url, archive.title, archive.screenshot, archive.images,
+		ad.post_id, ad.title, ad.url, ad.body, ad._images,
+		)
+	last_id = since_id
+	while True:
+		# Paging by id rather than offset, so every chunk is an index lookup.
+		query = (archive.select(*fields)
+			.join(ad)
+			.where(archive.id > last_id)
+			.order_by(archive.id)
+			.limit(chunk_size)
+			.tuples())
+		# LIMIT already bounds each chunk, so the rows are simply read into a list.
+		chunk = [_row(values) for values in query]
+		if not chunk:
+			return
+		yield chunk
+		last_id = chunk[-1]['id']
+
+
+def export(path, fmt='jsonl', since_id=0, chunk_size=1000, models=None):
+	"""
+	Write archives to a file.
+
+	No file is created if there is nothing to export.
+
+	Args:
+		path (String): The file to write. `jsonl` exports are gzipped.
+	Kwargs:
+		fmt (String): `jsonl` or `parquet`. Parquet needs pyarrow.
+		since_id (Int): Only archives with a higher id are exported
+		chunk_size (Int): The number of rows read (and written) at a time
+		models (Object): See `iter_chunks`
+	Returns:
+		Tuple
+
+		(rows written, id of the last row written). The id is `since_id`
+		if nothing was written.
+	"""
+	if fmt not in FORMATS:
+		raise ValueError('Unknown export format: {}'.format(fmt))
+	writer_class = _JsonlWriter if fmt == 'jsonl' else _ParquetWriter
+	writer = None
+	rows = 0
+	last_id = since_id
+	try:
+		for chunk in iter_chunks(since_id, chunk_size, models):
+			if writer is None:
+				writer = writer_class(path)
+			writer.write(chunk)
+			rows += len(chunk)
+			last_id = chunk[-1]['id']
+	finally:
+		if writer is not None:
+			writer.close()
+	LOG.info('Exported {} archives to {}'.format(rows, path))
+	return rows, last_id
+
+
+def _row(values):
+	row = dict(zip(COLUMNS, values))
+	for column in LIST_COLUMNS:
+		row[column] = _url_list(row[column])
+	return row
+
+
+def _url_list(value):
+	# Depending on the query, the field may or may not have been converted
+	# from its stored `%%` separated form already.
+	if isinstance(value, str):
+		value = value.split('%%')
+	return [url for url in value or [] if url]
+
+
+class _JsonlWriter(object):
+	def __init__(self, path):
+		super(_JsonlWriter, self).__init__()
+		self._file = gzip.open(path, 'wt', encoding='utf-8')
+
+	def write(self, chunk):
+		self._file.writelines(json.dumps(row) + '\n' for row in chunk)
+
+	def close(self):
+		self._file.close()
+
+
+class _ParquetWriter(object):
+	"""Writes each chunk as its own row group."""
+	def __init__(self, path):
+		super(_ParquetWriter, self).__init__()
+		try:
+			import pyarrow
+			import pyarrow.parquet
+		except ImportError:
+			raise ImportError('pyarrow is needed to export to parquet (pip install pyarrow)')
+		self._pa = pyarrow
+		fields = []
+		for column in COLUMNS:
+			if column == 'id':
+				kind = pyarrow.int64()
+			elif column in LIST_COLUMNS:
+				kind = pyarrow.list_(pyarrow.string())
+			else:
+				kind = pyarrow.string()
+			fields.append(pyarrow.field(column, kind))
+		self._schema = pyarrow.schema(fields)
+		self._writer = pyarrow.parquet.ParquetWriter(path, self._schema, compression='zstd')
+
+	def write(self, chunk):
+		columns = {column: [row[column] for row in chunk] for column in COLUMNS}
+		self._writer.write_table(self._pa.Table.from_pydict(columns, schema=self._schema))
+
+	def close(self):
+		self._writer.close()
+
+
+def _read_watermark(path):
+	try:
+		with open(path, 'r') as f:
+			return int(f.read().strip() or 0)
+	except FileNotFoundError:
+		return 0
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Export the archive to jsonl or parquet.')
+	parser.add_argument('database', help='the sqlite database to export')
+	parser.add_argument('output', help='the file to write')
+	parser.add_argument('--format', choices=FORMATS, default='jsonl')
+	parser.add_argument('--since', type=int, default=0, help='only export archives after this id')
+	parser.add_argument('--watermark', help='file holding the last exported id, read and updated')
+	parser.add_argument('--chunk-size', type=int, default=1000)
+	args = parser.parse_args(argv)
+
+	since_id = args.since
+	if args.watermark:
+		since_id = max(since_id, _read_watermark(args.watermark))
+	DATABASE.init(args.database)
+	try:
+		rows, last_id = export(args.output, args.format, since_id, args.chunk_size)
+	finally:
+		DATABASE.close()
+	if args.watermark:
+		# Only written once the export has finished, so a failed export is
+		# simply run again from the same place.
+		with open(args.watermark, 'w') as f:
+			f.write(str(last_id))
+	print('Exported {} archives (last id {})'.format(rows, last_id))
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
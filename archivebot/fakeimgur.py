@@ -0,0 +1,184 @@
+"""
+Local stand-in for the parts of the Imgur api used by the bot.
+
+Lets the uploader be tested (and benchmarked) without network access or an
+api key. It can also be run on its own:
+
+	python -m archivebot.fakeimgur --port 8000 --latency 0.2
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class FakeImgur(object):
+	"""
+	Threaded http server that behaves like the Imgur image and album api.
+
+	Every image upload and album creation costs credits the same way the real
+	api does, and the rate limit headers are sent with every response.
+
+	Kwargs:
+		port (Int): Port to listen on. The default of 0 picks a free port.
+		client_limit (Int): Credits available to the client
+		user_limit (Int): Credits available to the user
+		failures (Int): The number of image uploads that should fail with a
+			server error before uploads start succeeding.
+		latency (Float): Seconds to wait before answering each request, to
+			simulate a real network.
+	"""
+	post_cost = 10
+
+	def __init__(self, port=0, client_limit=12500, user_limit=2000, failures=0, latency=0):
+		super(FakeImgur, self).__init__()
+		self.port = port
+		self.client_remaining = client_limit
+		self.client_limit = client_limit
+		self.user_remaining = user_limit
+		self.user_limit = user_limit
+		self.failures = failures
+		self.latency = latency
+		# id => {'name': String, 'size': Int, 'deletehash': String}
+		self.images = {}
+		# id => {'title': String, 'images': List}
+		self.albums = {}
+		self.requests = 0
+		self._lock = threading.Lock()
+		self._server = None
+		self._thread = None
+
+	@property
+	def url(self):
+		return 'http://127.0.0.1:{}/3'.format(self._server.server_port)
+
+	def start(self):
+		self._server = ThreadingHTTPServer(('127.0.0.1', self.port), _Handler)
+		self._server.daemon_threads = True
+		self._server.fake = self
+		self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+		self._thread.start()
+		return self
+
+	def stop(self):
+		self._server.shutdown()
+		self._server.server_close()
+		self._thread.join()
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *exc):
+		self.stop()
+
+	def rate_limit_headers(self):
+		return {
+			'X-RateLimit-ClientLimit': self.client_limit,
+			'X-RateLimit-ClientRemaining': self.client_remaining,
+			'X-RateLimit-UserLimit': self.user_limit,
+			'X-RateLimit-UserRemaining': self.user_remaining,
+			'X-RateLimit-UserReset': int(time.time()) + 3600,
+			}
+
+	def upload_image(self, name, data):
+		"""Returns a tuple of (status code, response data)"""
+		with self._lock:
+			self.requests += 1
+			if not self._charge():
+				return 429, {'error': 'Too Many Requests'}
+			if self.failures > 0:
+				self.failures -= 1
+				return 500, {'error': 'Internal Server Error'}
+			image_id = self._new_id()
+			deletehash = self._new_id()
+			self.images[image_id] = {'name': name, 'size': len(data), 'deletehash': deletehash}
+		return 200, {
+			'id': image_id, 'deletehash': deletehash,
+			'link': 'https://i.imgur.com/{}.jpg'.format(image_id)
+			}
+
+	def create_album(self, title, deletehashes):
+		"""Returns a tuple of (status code, response data)"""
+		with self._lock:
+			self.requests += 1
+			if not self._charge():
+				return 429, {'error': 'Too Many Requests'}
+			by_hash = {image['deletehash']: image_id for image_id, image in self.images.items()}
+			missing = [h for h in deletehashes if h not in by_hash]
+			if missing:
+				return 400, {'error': 'Unknown deletehashes: {}'.format(missing)}
+			album_id = self._new_id()
+			self.albums[album_id] = {
+				'title': title, 'images': [by_hash[h] for h in deletehashes]}
+		return 200, {'id': album_id, 'deletehash': self._new_id()}
+
+	def _charge(self):
+		if self.client_remaining < self.post_cost or self.user_remaining < self.post_cost:
+			return False
+		self.client_remaining -= self.post_cost
+		self.user_remaining -= self.post_cost
+		return True
+
+	def _new_id(self):
+		return uuid.uuid4().hex[:7]
+
+
+class _Handler(BaseHTTPRequestHandler):
+	def do_POST(self):
+		fake = self.server.fake
+		if fake.latency:
+			time.sleep(fake.latency)
+		length = int(self.headers.get('Content-Length', 0))
+		body = self.rfile.read(length)
+		if self.path == '/3/image':
+			name, data = self._parse_image(body)
+			status, data = fake.upload_image(name, data)
+		elif self.path == '/3/album':
+			form = parse_qs(body.decode())
+			status, data = fake.create_album(
+				form.get('title', [''])[0], form.get('deletehashes[]', []))
+		else:
+			status, data = 404, {'error': 'Not Found'}
+		self._respond(status, data, fake.rate_limit_headers())
+
+	def _parse_image(self, body):
+		header = 'Content-Type: {}\r\n\r\n'.format(self.headers['Content-Type'])
+		message = BytesParser(policy=HTTP).parsebytes(header.encode() + body)
+		for part in message.iter_parts():
+			if part.get_param('name', header='content-disposition') == 'image':
+				return part.get_filename(), part.get_payload(decode=True)
+		return None, b''
+
+	def _respond(self, status, data, headers):
+		payload = json.dumps({'data': data, 'success': status == 200, 'status': status})
+		payload = payload.encode()
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(payload)))
+		for header, value in headers.items():
+			self.send_header(header, str(value))
+		self.end_headers()
+		self.wfile.write(payload)
+
+	def log_message(self, *args):
+		pass
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+	parser.add_argument('--port', type=int, default=8000)
+	parser.add_argument('--latency', type=float, default=0)
+	parser.add_argument('--failures', type=int, default=0)
+	args = parser.parse_args()
+	server = FakeImgur(port=args.port, latency=args.latency, failures=args.failures)
+	server.start()
+	print('Fake Imgur api listening at {}'.format(server.url))
+	try:
+		server._thread.join()
+	except KeyboardInterrupt:
+		server.stop()
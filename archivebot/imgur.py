@@ -0,0 +1,221 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .custommodels import Archive, ImageUpload
+from .errors import ImgurUploadError, RateLimitError
+from .lazy import lazy_import
+
+
+requests = lazy_import('requests')
+
+
+LOG = logging.getLogger(__name__)
+
+API_URL = 'https://api.imgur.com/3'
+ALBUM_URL = 'https://imgur.com/a/{}'
+
+# Imgur charges 10 credits for every POST request, uploads included.
+# https://apidocs.imgur.com/#rate-limits
+POST_COST = 10
+
+
+class RateLimit(object):
+	"""
+	Keeps track of the rate limit headers Imgur sends with every response.
+
+	Imgur limits both the application (client) and the ip address doing the
+	uploading (user). The client limit resets daily, while the user limit
+	resets hourly at the time given in `X-RateLimit-UserReset`.
+
+	Nothing is known until the first response comes back, so every value
+	starts out as None.
+	"""
+	headers = {
+		'client_limit': 'X-RateLimit-ClientLimit',
+		'client_remaining': 'X-RateLimit-ClientRemaining',
+		'user_limit': 'X-RateLimit-UserLimit',
+		'user_remaining': 'X-RateLimit-UserRemaining',
+		'user_reset': 'X-RateLimit-UserReset',
+		}
+
+	def __init__(self):
+		super(RateLimit, self).__init__()
+		self._lock = threading.Lock()
+		for attr in self.headers:
+			setattr(self, attr, None)
+
+	def update(self, headers):
+		"""
+		Update the remaining credits from the headers of a response.
+
+		Args:
+			headers (Mapping): The headers of an Imgur api response
+		Returns:
+			Void
+		"""
+		with self._lock:
+			for attr, header in self.headers.items():
+				value = headers.get(header)
+				if value is not None:
+					setattr(self, attr, int(value))
+
+	def check(self, cost=POST_COST):
+		"""
+		Make sure there are enough credits left to make a request.
+
+		Args:
+			cost (Int): The number of credits the request will use
+		Returns:
+			Void
+		Raises:
+			RateLimitError
+		"""
+		with self._lock:
+			if self.client_remaining is not None and self.client_remaining < cost:
+				msg = 'Imgur client rate limit reached ({} credits left)'
+				raise RateLimitError(msg.format(self.client_remaining))
+			if self.user_remaining is not None and self.user_remaining < cost:
+				msg = 'Imgur user rate limit reached ({} credits left), resets at {}'
+				raise RateLimitError(msg.format(self.user_remaining, self.user_reset))
+
+
+class ImgurUploader(object):
+	"""
+	Uploads the screenshot and images of an ad to a new Imgur album.
+
+	Images are uploaded concurrently over a single pooled session, then the
+	album is created in one request from the uploaded images. Every finished
+	upload is recorded as an `ImageUpload`, so if an upload fails (or the bot
+	crashes) part way through, the next attempt only uploads what is missing.
+
+	Args:
+		client_id (String): The Imgur api client id
+	Kwargs:
+		api_url (String): Base url of the Imgur api. Can be pointed at a
+			`fakeimgur.FakeImgur` server for testing.
+		workers (Int): The number of images to upload at the same time
+		session (requests.Session): Session to use instead of creating one
+	"""
+	def __init__(self, client_id, api_url=API_URL, workers=4, session=None):
+		super(ImgurUploader, self).__init__()
+		self.api_url = api_url.rstrip('/')
+		self.workers = workers
+		self.rate_limit = RateLimit()
+		self._session = session or requests.Session()
+		# One connection per worker, so uploads never wait on each other for
+		# a socket.
+		adapter = requests.adapters.HTTPAdapter(pool_maxsize=workers)
+		self._session.mount('https://', adapter)
+		self._session.mount('http://', adapter)
+		self._session.headers['Authorization'] = 'Client-ID {}'.format(client_id)
+
+	def upload(self, ad, screenshot, images):
+		"""
+		Upload an ad to a new Imgur album.
+
+		Args:
+			ad (CraigslistAd): The ad being archived
+			screenshot (String): Local path to the full-page screenshot. This
+				will be the first image of the album.
+			images (List): Local paths to the images of the ad. A failed
+				upload can be retried with new paths (e.g. a new screenshot),
+				as long as the images are in the same order.
+		Returns:
+			Archive
+
+			An unsaved archive of the new album.
+		Raises:
+			ImgurUploadError
+			RateLimitError
+		"""
+		paths = [screenshot] + list(images)
+		uploads = self._upload_images(ad.post_id, paths)
+		title = 'reddit-cl-bot archive {}'.format(ad.post_id)
+		album_id = self._create_album(title, [upload.deletehash for upload in uploads])
+		LOG.info('Album created for {}: {}'.format(ad.post_id, album_id))
+		return Archive(
+			url=ALBUM_URL.format(album_id), title=title, ad=ad,
+			screenshot=uploads[0].link,
+			images=[upload.link for upload in uploads[1:]]
+			)
+
+	def _upload_images(self, post_id, paths):
+		# Resumed by position in the album rather than by path, since
+		# screenshots are saved to a new temporary file on every attempt.
+		query = ImageUpload.select().where(ImageUpload.post_id == post_id)
+		done = {upload.position: upload for upload in query}
+		pending = [position for position in range(len(paths)) if position not in done]
+		if len(pending) < len(paths):
+			LOG.info('Resuming upload of {}: {} of {} images already uploaded'.format(
+				post_id, len(paths) - len(pending), len(paths)))
+
+		error = None
+		with ThreadPoolExecutor(max_workers=self.workers) as executor:
+			futures = {
+				executor.submit(self._upload_image, paths[position]): position
+				for position in pending
+				}
+			# Every future is waited on, even after an error, so uploads that
+			# still finish are recorded and not repeated on the next attempt.
+			for future in as_completed(futures):
+				if future.cancelled():
+					continue
+				position = futures[future]
+				try:
+					data = future.result()
+				except Exception as e:
+					error = error or e
+					if isinstance(e, RateLimitError):
+						# Nothing still queued is going to get through.
+						for f in futures:
+							f.cancel()
+					continue
+				# Recorded from this thread only, since sqlite connections
+				# are per-thread.
+				done[position] = ImageUpload.create(
+					post_id=post_id, position=position, path=paths[position],
+					link=data['link'], deletehash=data['deletehash']
+					)
+		if error is not None:
+			raise error
+		return [done[position] for position in range(len(paths))]
+
+	def _upload_image(self, pth):
+		self.rate_limit.check()
+		try:
+			with open(pth, 'rb') as f:
+				response = self._session.post(
+					self.api_url + '/image', files={'image': f}, data={'type': 'file'})
+		except (requests.RequestException, OSError) as e:
+			msg = 'Imgur upload failed ({}): {}'.format(e, pth)
+			LOG.error(msg)
+			raise ImgurUploadError(msg) from e
+		data = self._parse(response, pth)
+		LOG.debug('Image uploaded: {} => {}'.format(pth, data['link']))
+		return data
+
+	def _create_album(self, title, deletehashes):
+		self.rate_limit.check()
+		try:
+			response = self._session.post(
+				self.api_url + '/album',
+				data={'title': title, 'deletehashes[]': deletehashes}
+				)
+		except requests.RequestException as e:
+			msg = 'Imgur album creation failed ({}): {}'.format(e, title)
+			LOG.error(msg)
+			raise ImgurUploadError(msg) from e
+		return self._parse(response, title)['id']
+
+	def _parse(self, response, name):
+		self.rate_limit.update(response.headers)
+		if response.status_code == 429:
+			msg = 'Rate limited by Imgur while uploading {}'.format(name)
+			LOG.error(msg)
+			raise RateLimitError(msg)
+		if not response.ok:
+			msg = 'Imgur upload failed (status code {}): {}'.format(response.status_code, name)
+			LOG.error(msg)
+			raise ImgurUploadError(msg)
+		return response.json()['data']
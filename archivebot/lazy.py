@@ -0,0 +1,47 @@
+import sys
+import importlib.util
+
+
+def lazy_import(name):
+	"""
+	Import a module that is only loaded the first time it is used.
+
+	The bot only needs requests, BeautifulSoup, etc. once it starts working
+	on a post, so there is no reason for them to slow down startup. The
+	returned module is a stand-in that loads the real module on the first
+	attribute access.
+
+	See https://docs.python.org/3/library/importlib.html#implementing-lazy-imports
+
+	Args:
+		name (String): The full name of the module
+	Returns:
+		Module
+	Raises:
+		ImportError: If the module is not installed
+	"""
+	if name in sys.modules:
+		return sys.modules[name]
+	spec = importlib.util.find_spec(name)
+	if spec is None:
+		raise ImportError('No module named {!r}'.format(name), name=name)
+	loader = importlib.util.LazyLoader(spec.loader)
+	spec.loader = loader
+	module = importlib.util.module_from_spec(spec)
+	sys.modules[name] = module
+	loader.exec_module(module)
+	return module
+
+
+def load(module):
+	"""
+	Finish loading a module returned by `lazy_import`.
+
+	Args:
+		module (Module):
+	Returns:
+		Module
+	"""
+	# Any attribute access triggers the real import.
+	getattr(module, '__name__')
+	return module
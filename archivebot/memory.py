@@ -0,0 +1,246 @@
+"""
+Keeps a long-running worker's memory in check.
+
+Every post creates a lot of short-lived objects (soup trees, html2text
+output, praw objects), and fragmentation means RSS creeps up even when
+nothing is leaking. Rather than restarting the bot on a timer, a worker asks
+the `MemoryGovernor` after each job whether it has grown too big, and exits
+with `RECYCLE_EXIT_CODE` if it has. `prefork.serve` then forks a fresh
+worker from the warm parent:
+
+	governor = MemoryGovernor(ceiling_mb=300)
+	while True:
+		with governor.stage('request_page'):
+			html = request_page(url)
+		with governor.stage('scrape_page'):
+			ad = scrape_page(html)
+		...
+		governor.check()
+"""
+import os
+import gc
+import sys
+import logging
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+
+LOG = logging.getLogger(__name__)
+
+# Exit code of a worker that stopped itself to be replaced by a fresh one.
+RECYCLE_EXIT_CODE = 75
+# Object types worth watching, by class name.
+TRACKED_TYPES = ('BeautifulSoup', 'Tag', 'NavigableString', 'RedditPost', 'Submission', 'Comment')
+
+
+def rss_bytes():
+	"""
+	Get the resident set size of this process.
+
+	Read from /proc on Linux. Elsewhere, falls back to `resource`, which only
+	knows the peak RSS rather than the current one.
+
+	Returns:
+		Int
+	"""
+	try:
+		with open('/proc/self/statm', 'r') as f:
+			return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+	except (OSError, ValueError, IndexError):
+		pass
+	import resource
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# Kilobytes on Linux, bytes on macOS.
+	return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def estimate_size(obj, _seen=None):
+	"""
+	Estimate the bytes used by an object and everything it contains.
+
+	Follows lists, tuples, sets, dicts and instance `__dict__`s. Objects seen
+	more than once are only counted once.
+
+	Args:
+		obj (Object):
+	Returns:
+		Int
+	"""
+	if _seen is None:
+		_seen = set()
+	if id(obj) in _seen:
+		return 0
+	_seen.add(id(obj))
+	size = sys.getsizeof(obj)
+	if isinstance(obj, (str, bytes, bytearray, int, float)):
+		return size
+	if isinstance(obj, dict):
+		size += sum(estimate_size(k, _seen) + estimate_size(v, _seen) for k, v in obj.items())
+	elif isinstance(obj, (list, tuple, set, frozenset)):
+		size += sum(estimate_size(item, _seen) for item in obj)
+	elif hasattr(obj, '__dict__'):
+		size += estimate_size(vars(obj), _seen)
+	return size
+
+
+class ByteBoundedCache(object):
+	"""
+	A dict that drops its oldest entries once it holds too many bytes.
+
+	Entries are kept oldest first. Setting a key, or reading it with `get`,
+	makes it the newest. Sizes are estimates (see `estimate_size`), worked
+	out once when an entry is set.
+
+	Kwargs:
+		max_bytes (Int): The most bytes held by keys and values together
+		max_entries (Int): The most entries held, if also limited by count
+		sizeof (Callable): Returns the size of a key or value in bytes
+	"""
+	def __init__(self, max_bytes=1024 * 1024, max_entries=None, sizeof=estimate_size):
+		super(ByteBoundedCache, self).__init__()
+		self.max_bytes = max_bytes
+		self.max_entries = max_entries
+		self.bytes = 0
+		self._sizeof = sizeof
+		# key => (value, size)
+		self._entries = OrderedDict()
+
+	def get(self, key, default=None):
+		try:
+			value, _ = self._entries[key]
+		except KeyError:
+			return default
+		self._entries.move_to_end(key)
+		return value
+
+	def items(self):
+		"""Returns (key, value) pairs, oldest first"""
+		return ((key, value) for key, (value, _) in self._entries.items())
+
+	def clear(self):
+		self._entries.clear()
+		self.bytes = 0
+
+	def __setitem__(self, key, value):
+		if key in self._entries:
+			del self[key]
+		size = self._sizeof(key) + self._sizeof(value)
+		self._entries[key] = (value, size)
+		self.bytes += size
+		self._evict()
+
+	def __getitem__(self, key):
+		return self._entries[key][0]
+
+	def __delitem__(self, key):
+		_, size = self._entries.pop(key)
+		self.bytes -= size
+
+	def __contains__(self, key):
+		return key in self._entries
+
+	def __len__(self):
+		return len(self._entries)
+
+	def __iter__(self):
+		return iter(self._entries)
+
+	def _evict(self):
+		while self._entries and (self.bytes > self.max_bytes or
+				(self.max_entries is not None and len(self._entries) > self.max_entries)):
+			key, (_, size) = self._entries.popitem(last=False)
+			self.bytes -= size
+			LOG.debug('Evicted {!r} from cache'.format(key))
+
+
+class MemoryGovernor(object):
+	"""
+	Watches a worker's memory and says when it should be recycled.
+
+	Kwargs:
+		ceiling_mb (Float): The RSS, in megabytes, past which the worker is
+			recycled
+		count_every (Int): Count live objects of `TRACKED_TYPES` around every
+			stage of every `count_every`th job. Counting walks every object
+			in the process, so it is too slow to do every time. 0 never
+			counts.
+		rss (Callable): Returns the current RSS in bytes
+	Attributes:
+		stages (Dict): Stage name => Counter with the number of `calls`, the
+			total `rss` growth in bytes, and the total growth of each tracked
+			type over the counted calls.
+	"""
+	def __init__(self, ceiling_mb=512, count_every=100, rss=rss_bytes):
+		super(MemoryGovernor, self).__init__()
+		self.ceiling = int(ceiling_mb * 1024 * 1024)
+		self.count_every = count_every
+		self.stages = {}
+		self.jobs = 0
+		self._rss = rss
+
+	@contextmanager
+	def stage(self, name):
+		"""Measure how much one stage of a job grows memory. Use as a context manager."""
+		counting = self.count_every and self.jobs % self.count_every == 0
+		before = self._rss()
+		objects = object_counts() if counting else None
+		try:
+			yield
+		finally:
+			totals = self.stages.setdefault(name, Counter())
+			totals['calls'] += 1
+			totals['rss'] += self._rss() - before
+			if counting:
+				after = object_counts()
+				for kind in TRACKED_TYPES:
+					totals[kind] += after[kind] - objects[kind]
+
+	def should_recycle(self):
+		"""
+		Returns:
+			Boolean
+
+			Whether the worker has grown past the ceiling.
+		"""
+		return self._rss() > self.ceiling
+
+	def check(self):
+		"""
+		Call between jobs. Exits the worker if it has grown past the ceiling.
+
+		Raises:
+			SystemExit: With `RECYCLE_EXIT_CODE`
+		"""
+		self.jobs += 1
+		if not self.should_recycle():
+			return
+		LOG.warning('Recycling worker after {} jobs at {:.0f}MB. Growth by stage: {}'.format(
+			self.jobs, self._rss() / 1024 / 1024, self.summary()))
+		raise SystemExit(RECYCLE_EXIT_CODE)
+
+	def summary(self):
+		"""
+		Returns:
+			Dict
+
+			Stage name => average RSS growth per call, in kilobytes.
+		"""
+		return {name: round(totals['rss'] / totals['calls'] / 1024, 1)
+			for name, totals in self.stages.items()}
+
+
+def object_counts(types=TRACKED_TYPES):
+	"""
+	Count live objects by class name.
+
+	Args:
+		types (Tuple): The class names to count
+	Returns:
+		Counter
+	"""
+	counts = Counter()
+	for obj in gc.get_objects():
+		name = type(obj).__name__
+		if name in types:
+			counts[name] += 1
+	return counts
@@ -0,0 +1,137 @@
+"""
+Pre-forking runner for bot workers.
+
+Everything that is slow to set up (imports, the html parser, the database
+schema, the http session) is done once in the parent process. Workers are
+then forked from the warm parent, so starting, or restarting, a worker
+costs milliseconds instead of seconds.
+"""
+import os
+import time
+import signal
+import logging
+
+from . import bot, craigslist
+from .custommodels import DATABASE, MODELS
+from .lazy import load
+from .memory import RECYCLE_EXIT_CODE
+
+
+LOG = logging.getLogger(__name__)
+
+
+def warm_up(database=None):
+	"""
+	Import and initialize everything the workers share.
+
+	The database connection is closed again before returning. sqlite
+	connections can't be shared between processes, so each worker opens its
+	own on first use, but the database is already initialized and its tables
+	created.
+
+	Kwargs:
+		database (String): Path to the sqlite database. The database is left
+			alone if not given.
+	Returns:
+		Void
+	"""
+	start = time.perf_counter()
+	for module in (bot.requests, craigslist.bs4, craigslist.html2text):
+		load(module)
+	# The first parse loads the parser's own submodules and compiles its
+	# regexes, which would otherwise happen in every worker.
+	craigslist.html2text.html2text(str(craigslist.bs4.BeautifulSoup('<p>warm</p>', 'html.parser')))
+	bot.get_session()
+	if database is not None:
+		DATABASE.init(database)
+		DATABASE.connect()
+		DATABASE.create_tables(MODELS, safe=True)
+		DATABASE.close()
+	LOG.info('Warmed up in {:.0f}ms'.format((time.perf_counter() - start) * 1000))
+
+
+def serve(worker, workers=2, database=None, warm=True, restart_delay=5):
+	"""
+	Run `worker` in forked processes, restarting any that exit.
+
+	Blocks until the parent process receives SIGINT or SIGTERM, which is
+	passed on to the workers.
+
+	Args:
+		worker (Callable): Called with no arguments in each worker process.
+			The process exits when it returns. A worker that has grown too
+			big should exit with `memory.RECYCLE_EXIT_CODE` (see
+			`MemoryGovernor.check`) to be replaced.
+	Kwargs:
+		workers (Int): The number of worker processes
+		database (String): Path to the sqlite database, see `warm_up`
+		warm (Boolean): Warm up the parent before forking. Without it, each
+			worker pays for its own imports.
+		restart_delay (Float): Seconds to wait before restarting a worker
+			that exited within `restart_delay` seconds of starting, so a
+			worker that crashes on startup doesn't spin.
+	Returns:
+		Void
+	"""
+	if warm:
+		warm_up(database)
+	elif database is not None:
+		DATABASE.init(database)
+
+	def stop(signum, frame):
+		raise SystemExit(0)
+	signal.signal(signal.SIGTERM, stop)
+
+	# pid => time started
+	children = {}
+	try:
+		for _ in range(workers):
+			pid = _spawn(worker)
+			children[pid] = time.monotonic()
+		while True:
+			pid, status = os.waitpid(-1, 0)
+			started = children.pop(pid, None)
+			if started is None:
+				continue
+			code = os.waitstatus_to_exitcode(status)
+			if code == RECYCLE_EXIT_CODE:
+				LOG.info('Worker {} recycled'.format(pid))
+			else:
+				LOG.warning('Worker {} exited with code {}'.format(pid, code))
+			if time.monotonic() - started < restart_delay:
+				time.sleep(restart_delay)
+			pid = _spawn(worker)
+			children[pid] = time.monotonic()
+	except (KeyboardInterrupt, SystemExit):
+		LOG.info('Stopping {} workers'.format(len(children)))
+		for pid in children:
+			_kill(pid)
+		for pid in children:
+			os.waitpid(pid, 0)
+
+
+def _spawn(worker):
+	pid = os.fork()
+	if pid:
+		LOG.info('Worker {} started'.format(pid))
+		return pid
+	signal.signal(signal.SIGTERM, signal.SIG_DFL)
+	signal.signal(signal.SIGINT, signal.SIG_DFL)
+	code = 0
+	try:
+		worker()
+	except SystemExit as e:
+		code = e.code if isinstance(e.code, int) else 1
+	except Exception:
+		LOG.exception('Worker crashed')
+		code = 1
+	finally:
+		# Skip the parent's cleanup handlers, which belong to the parent.
+		os._exit(code)
+
+
+def _kill(pid):
+	try:
+		os.kill(pid, signal.SIGTERM)
+	except ProcessLookupError:
+		pass
@@ -0,0 +1,294 @@
+"""
+Profiling for archive jobs.
+
+Each job (one post, from `request_page` to the reply) is wrapped in
+`profiler.job()`, and each step of it in `job.stage()`:
+
+	with profiler.job(url) as job:
+		with job.stage('request_page'):
+			html = request_page(url)
+		job.attach('html', html)
+		with job.stage('scrape_page'):
+			ad = scrape_page(html)
+		...
+
+While a job runs, a background thread samples its stack every few
+milliseconds, which is cheap enough to leave on all the time. Any job slower
+than the threshold is saved to the dump folder along with its samples,
+stage timings and attachments (like the html it was given). Saved jobs can
+be summarized with:
+
+	python -m archivebot.profiling report /path/to/dumps
+"""
+import sys
+import json
+import time
+import cProfile
+import pstats
+import logging
+import argparse
+import itertools
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+
+LOG = logging.getLogger(__name__)
+
+STAGES = ('request_page', 'scrape_page', 'persist', 'format', 'reply')
+
+
+class JobProfiler(object):
+	"""
+	Profiles archive jobs and saves the slow ones.
+
+	Args:
+		dump_dir (String): Where slow jobs are saved
+	Kwargs:
+		threshold_ms (Float): Jobs that take longer than this are saved
+		sample_interval (Float): Seconds between stack samples
+		max_depth (Int): The most frames kept from each sampled stack
+		full (Boolean): Also run cProfile on every job, and save its stats
+			with slow jobs. Much more detailed, but slows every job down.
+	"""
+	def __init__(self, dump_dir, threshold_ms=10000, sample_interval=0.01, max_depth=40, full=False):
+		super(JobProfiler, self).__init__()
+		self.dump_dir = Path(dump_dir)
+		self.threshold_ms = threshold_ms
+		self.sample_interval = sample_interval
+		self.max_depth = max_depth
+		self.full = full
+		# thread id => Job
+		self._active = {}
+		self._lock = threading.Lock()
+		self._sampler = None
+		self._dumps = itertools.count()
+
+	def job(self, name):
+		"""
+		Profile a job. Use as a context manager.
+
+		Args:
+			name (String): Identifies the job in dumps, e.g. the ad url
+		Returns:
+			Job
+		"""
+		return Job(self, name)
+
+	def _start(self, job):
+		with self._lock:
+			self._active[threading.get_ident()] = job
+			if self._sampler is None or not self._sampler.is_alive():
+				self._sampler = threading.Thread(target=self._sample, daemon=True)
+				self._sampler.start()
+
+	def _finish(self, job):
+		with self._lock:
+			self._active.pop(threading.get_ident(), None)
+		if job.duration_ms >= self.threshold_ms:
+			# Profiling must never fail the job it is watching.
+			try:
+				self._dump(job)
+			except Exception:
+				LOG.exception('Could not save slow job {}'.format(job.name))
+
+	def _sample(self):
+		while True:
+			time.sleep(self.sample_interval)
+			# Samples are added under the lock, so a job is never written to
+			# once `_finish` has removed it.
+			with self._lock:
+				if not self._active:
+					# Stop when idle; the next job starts a new sampler.
+					self._sampler = None
+					return
+				frames = sys._current_frames()
+				for ident, job in self._active.items():
+					frame = frames.get(ident)
+					if frame is not None:
+						job.samples[self._stack(frame)] += 1
+
+	def _stack(self, frame):
+		stack = []
+		while frame is not None and len(stack) < self.max_depth:
+			code = frame.f_code
+			# The function's first line rather than the current one, so every
+			# sample inside the same function counts as the same frame.
+			stack.append('{}:{} {}'.format(code.co_filename, code.co_firstlineno, code.co_name))
+			frame = frame.f_back
+		# Outermost frame first, the way flame graphs read.
+		return tuple(reversed(stack))
+
+	def _dump(self, job):
+		self.dump_dir.mkdir(parents=True, exist_ok=True)
+		prefix = '{}-{}'.format(time.strftime('%Y%m%d-%H%M%S'), next(self._dumps))
+		for name, text in job.attachments.items():
+			(self.dump_dir / '{}.{}'.format(prefix, name)).write_text(text)
+		hottest = hottest_frame(job.samples)
+		if job.profile is not None:
+			pth = str(self.dump_dir / '{}.prof'.format(prefix))
+			job.profile.dump_stats(pth)
+			hottest = hottest or _hottest_profiled(pth)
+		summary = {
+			'name': job.name,
+			'started': job.started,
+			'duration_ms': job.duration_ms,
+			'stages': job.stages,
+			'hottest': hottest,
+			'samples': [[list(stack), count] for stack, count in job.samples.most_common()],
+			'attachments': sorted(job.attachments),
+			}
+		with open(str(self.dump_dir / '{}.json'.format(prefix)), 'w') as f:
+			json.dump(summary, f, indent=1)
+		LOG.warning('Slow job ({:.0f}ms) saved as {}: {}'.format(job.duration_ms, prefix, job.name))
+
+
+class Job(object):
+	"""
+	A single profiled job. Created by `JobProfiler.job`.
+
+	Attributes:
+		stages (List): [stage name, milliseconds] for each stage, in order
+		samples (Counter): Sampled stacks and how often each was seen
+		attachments (Dict): Name => text saved along with a slow job
+		duration_ms (Float): How long the job took, once finished
+	"""
+	def __init__(self, profiler, name):
+		super(Job, self).__init__()
+		self.name = name
+		self.stages = []
+		self.samples = Counter()
+		self.attachments = {}
+		self.started = None
+		self.duration_ms = None
+		self.profile = None
+		self._profiler = profiler
+		self._start = None
+
+	def __enter__(self):
+		self.started = time.time()
+		self._start = time.perf_counter()
+		if self._profiler.full:
+			self.profile = cProfile.Profile()
+			self.profile.enable()
+		self._profiler._start(self)
+		return self
+
+	def __exit__(self, *exc):
+		if self.profile is not None:
+			self.profile.disable()
+		self.duration_ms = (time.perf_counter() - self._start) * 1000
+		self._profiler._finish(self)
+
+	@contextmanager
+	def stage(self, name):
+		"""Time one stage of the job. Use as a context manager."""
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.stages.append([name, (time.perf_counter() - start) * 1000])
+
+	def attach(self, name, text):
+		"""
+		Keep some text (e.g. the html of the ad) to save if the job is slow.
+
+		Args:
+			name (String): Used as the file extension of the saved text
+			text (String):
+		"""
+		self.attachments[name] = text
+
+
+class NullProfiler(object):
+	"""Stand-in for JobProfiler when profiling is turned off."""
+	def job(self, name):
+		return _NullJob()
+
+
+class _NullJob(object):
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		pass
+
+	@contextmanager
+	def stage(self, name):
+		yield
+
+	def attach(self, name, text):
+		pass
+
+
+def hottest_frame(samples):
+	"""
+	Find the frame that was on top of the stack most often.
+
+	Args:
+		samples (Counter): Sampled stacks => count
+	Returns:
+		String
+
+		The frame as `file:line function`, or None without any samples.
+	"""
+	leaves = Counter()
+	for stack, count in samples.items():
+		if stack:
+			leaves[stack[-1]] += count
+	if not leaves:
+		return None
+	return leaves.most_common(1)[0][0]
+
+
+def _hottest_profiled(pth):
+	stats = pstats.Stats(pth)
+	if not stats.stats:
+		return None
+	(filename, line, function), _ = max(stats.stats.items(), key=lambda item: item[1][2])
+	return '{}:{} {}'.format(filename, line, function)
+
+
+def report(dump_dir):
+	"""
+	Group saved slow jobs by their hottest frame.
+
+	Args:
+		dump_dir (String): The folder slow jobs were saved to
+	Returns:
+		List
+
+		(hottest frame, job count, mean ms, max ms, slowest job name)
+		tuples, most jobs first.
+	"""
+	groups = {}
+	for pth in sorted(Path(dump_dir).glob('*.json')):
+		with open(str(pth), 'r') as f:
+			job = json.load(f)
+		groups.setdefault(job['hottest'] or '<no samples>', []).append(job)
+	rows = []
+	for hottest, jobs in groups.items():
+		durations = [job['duration_ms'] for job in jobs]
+		slowest = max(jobs, key=lambda job: job['duration_ms'])
+		rows.append((hottest, len(jobs), sum(durations) / len(jobs), max(durations), slowest['name']))
+	return sorted(rows, key=lambda row: (-row[1], -row[3]))
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Summarize slow archive jobs.')
+	subparsers = parser.add_subparsers(dest='command')
+	report_parser = subparsers.add_parser('report', help='group slow jobs by hottest frame')
+	report_parser.add_argument('dump_dir')
+	args = parser.parse_args(argv)
+	if args.command != 'report':
+		parser.print_help()
+		return 1
+	for hottest, count, mean_ms, max_ms, slowest in report(args.dump_dir):
+		print('{:>5} jobs  mean {:>8.0f}ms  max {:>8.0f}ms  {}'.format(count, mean_ms, max_ms, hottest))
+		print('             slowest: {}'.format(slowest))
+	return 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
@@ -0,0 +1,328 @@
+import re
+import time
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+
+from peewee import fn
+
+from .custommodels import OutboxReply
+
+
+LOG = logging.getLogger(__name__)
+
+# How long to back off when Reddit says we're rate limited, but not for how long.
+DEFAULT_RATELIMIT_DELAY = 60
+
+
+def parse_ratelimit_message(message):
+	"""
+	Get the wait time out of a Reddit `RATELIMIT` error message.
+
+	Args:
+		message (String): e.g. "you are doing that too much. try again in
+			9 minutes."
+	Returns:
+		Float
+
+		The number of seconds to wait.
+	"""
+	match = re.search(r'(\d+)\s*(second|minute|hour)', message or '', re.I)
+	if not match:
+		return DEFAULT_RATELIMIT_DELAY
+	seconds = {'second': 1, 'minute': 60, 'hour': 60 * 60}
+	return float(match.group(1)) * seconds[match.group(2).lower()]
+
+
+def parse_ratelimit_headers(headers):
+	"""
+	Get the wait time out of the rate limit headers of a Reddit response.
+
+	Args:
+		headers (Mapping): The response headers
+	Returns:
+		Float
+
+		The number of seconds to wait, or None if there is no need to wait.
+	"""
+	headers = {key.lower(): value for key, value in headers.items()}
+	if 'retry-after' in headers:
+		return _retry_after(headers['retry-after'])
+	try:
+		remaining = float(headers['x-ratelimit-remaining'])
+	except (KeyError, ValueError):
+		return None
+	if remaining < 1:
+		try:
+			return float(headers['x-ratelimit-reset'])
+		except (KeyError, ValueError):
+			return DEFAULT_RATELIMIT_DELAY
+	return None
+
+
+def _retry_after(value):
+	# Either a number of seconds or an http date.
+	try:
+		return float(value)
+	except ValueError:
+		pass
+	try:
+		return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+	except (TypeError, ValueError, IndexError):
+		LOG.warning('Could not parse Retry-After header: {!r}'.format(value))
+		return DEFAULT_RATELIMIT_DELAY
+
+
+def ratelimit_delay(error):
+	"""
+	Check whether an error raised while replying was a rate limit.
+
+	Handles both praw's `RATELIMIT` api errors and http 429 responses.
+
+	Args:
+		error (Exception):
+	Returns:
+		Float
+
+		The number of seconds to wait, or None if it wasn't a rate limit.
+	"""
+	# Newer versions of praw group api errors into `items`
+	for item in getattr(error, 'items', None) or [error]:
+		if getattr(item, 'error_type', None) == 'RATELIMIT':
+			return parse_ratelimit_message(getattr(item, 'message', ''))
+	response = getattr(error, 'response', None)
+	if response is not None and getattr(response, 'status_code', None) == 429:
+		delay = parse_ratelimit_headers(response.headers)
+		return delay if delay is not None else DEFAULT_RATELIMIT_DELAY
+	return None
+
+
+def praw_resolver(reddit):
+	"""
+	Create a function that finds a submission or comment from its fullname.
+
+	Args:
+		reddit (praw.Reddit):
+	Returns:
+		Callable
+	"""
+	def resolve(fullname):
+		kind, _, post_id = fullname.partition('_')
+		if kind == 't1':
+			return reddit.comment(post_id)
+		return reddit.submission(id=post_id)
+	return resolve
+
+
+class TokenBucket(object):
+	"""
+	Rate limiter that allows short bursts.
+
+	Kwargs:
+		rate (Float): Tokens added per second
+		capacity (Float): The most tokens that can be saved up
+		clock (Callable): Returns the current time in seconds
+	"""
+	def __init__(self, rate=1 / 10, capacity=5, clock=time.monotonic):
+		super(TokenBucket, self).__init__()
+		self.rate = rate
+		self.capacity = capacity
+		self._clock = clock
+		self._tokens = capacity
+		self._updated = clock()
+		self._paused_until = 0
+		self._lock = threading.Lock()
+
+	def take(self):
+		"""
+		Take a token if one is available.
+
+		Returns:
+			Boolean
+		"""
+		with self._lock:
+			now = self._refill()
+			if now < self._paused_until or self._tokens < 1:
+				return False
+			self._tokens -= 1
+			return True
+
+	def pause(self, seconds):
+		"""Hand out no tokens for `seconds`, and start empty afterwards."""
+		with self._lock:
+			now = self._clock()
+			self._paused_until = max(self._paused_until, now + seconds)
+			self._tokens = 0
+			self._updated = self._paused_until
+
+	def wait_time(self):
+		"""Returns the number of seconds until the next token is available"""
+		with self._lock:
+			now = self._refill()
+			if now < self._paused_until:
+				return self._paused_until - now
+			return max(0, (1 - self._tokens) / self.rate)
+
+	def _refill(self):
+		now = self._clock()
+		if now > self._updated:
+			self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+			self._updated = now
+		return now
+
+
+class ReplyScheduler(object):
+	"""
+	Posts replies from the outbox as fast as Reddit allows.
+
+	Replies are queued with `enqueue`, which only writes to the database, so
+	archiving never waits on Reddit. `send_pending` (or `run`, on its own
+	thread) posts them newest thread first, as fast as the token bucket
+	allows. When Reddit says to slow down, the bucket is paused for as long
+	as Reddit asks. A reply that fails for any other reason is retried with
+	exponential backoff. After `max_attempts` failures it is moved to the
+	dead letters, where it can be inspected and requeued.
+
+	Args:
+		resolve (Callable): Takes a fullname and returns an object with a
+			`reply(body)` method. See `praw_resolver`.
+	Kwargs:
+		bucket (TokenBucket):
+		max_attempts (Int): Failures before a reply is given up on
+		backoff (Float): Seconds to wait after the first failure. The wait
+			doubles with each failure after that.
+		clock (Callable): Returns the current unix time
+	"""
+	def __init__(self, resolve, bucket=None, max_attempts=5, backoff=60, clock=time.time):
+		super(ReplyScheduler, self).__init__()
+		self.resolve = resolve
+		self.bucket = bucket or TokenBucket()
+		self.max_attempts = max_attempts
+		self.backoff = backoff
+		self._clock = clock
+
+	def enqueue(self, post, body):
+		"""
+		Queue a reply to a post.
+
+		Args:
+			post (RedditPost): The post to reply to
+			body (String): Markdown formatted text of the reply
+		Returns:
+			OutboxReply
+		"""
+		return OutboxReply.create(
+			fullname=post.fullname, thread_id=post.thread_id,
+			body=body, priority=post.thread_created
+			)
+
+	def pending(self, limit=100):
+		"""
+		Get the replies that are due to be sent, in the order they'll be sent.
+
+		Kwargs:
+			limit (Int): The most replies to return
+		Returns:
+			peewee.SelectQuery
+		"""
+		return (OutboxReply.select()
+			.where(
+				(OutboxReply.status == 'pending') &
+				(OutboxReply.next_attempt <= self._clock()))
+			.order_by(OutboxReply.priority.desc(), OutboxReply.id)
+			.limit(limit))
+
+	def dead_letters(self):
+		"""
+		Returns:
+			peewee.SelectQuery
+
+			Every reply that was given up on.
+		"""
+		return OutboxReply.select().where(OutboxReply.status == 'dead').order_by(OutboxReply.id)
+
+	def requeue(self, reply):
+		"""Give a dead reply another full set of attempts."""
+		reply.status = 'pending'
+		reply.attempts = 0
+		reply.next_attempt = 0
+		reply.save()
+
+	def send_pending(self, limit=100):
+		"""
+		Send due replies until the outbox is empty or the bucket runs out.
+
+		Kwargs:
+			limit (Int): The most replies to try
+		Returns:
+			Int
+
+			The number of replies sent.
+		"""
+		sent = 0
+		# Loaded up front, since every reply is saved again as it's sent.
+		for reply in list(self.pending(limit)):
+			if not self.bucket.take():
+				break
+			result = self._send(reply)
+			if result is None:
+				# Rate limited, so nothing else will get through either.
+				break
+			sent += result
+		return sent
+
+	def run(self, stop, idle=5):
+		"""
+		Keep sending replies until `stop` is set.
+
+		Args:
+			stop (threading.Event):
+		Kwargs:
+			idle (Float): The longest to sleep between checks of the outbox
+		"""
+		while not stop.is_set():
+			if not self.send_pending():
+				stop.wait(self._sleep_time(idle))
+
+	def _sleep_time(self, idle):
+		"""How long to wait after a pass that sent nothing"""
+		if self.pending(limit=1).exists():
+			# Replies are due, but the bucket is empty or paused.
+			return min(max(self.bucket.wait_time(), 0.1), idle)
+		next_attempt = (OutboxReply
+			.select(fn.Min(OutboxReply.next_attempt))
+			.where(OutboxReply.status == 'pending')
+			.scalar())
+		if next_attempt is None:
+			return idle
+		return min(max(next_attempt - self._clock(), 0.1), idle)
+
+	def _send(self, reply):
+		try:
+			comment = self.resolve(reply.fullname).reply(reply.body)
+		except Exception as e:
+			delay = ratelimit_delay(e)
+			if delay is not None:
+				LOG.warning('Rate limited by Reddit, pausing replies for {:.0f} seconds'.format(delay))
+				self.bucket.pause(delay)
+				return None
+			self._failed(reply, e)
+			return 0
+		reply.status = 'sent'
+		reply.reply_id = str(getattr(comment, 'fullname', '') or '')
+		reply.save()
+		LOG.info('Replied to {}'.format(reply.fullname))
+		return 1
+
+	def _failed(self, reply, error):
+		reply.attempts += 1
+		reply.last_error = repr(error)
+		if reply.attempts >= self.max_attempts:
+			reply.status = 'dead'
+			LOG.error('Giving up on reply to {} after {} attempts: {!r}'.format(
+				reply.fullname, reply.attempts, error))
+		else:
+			reply.next_attempt = self._clock() + self.backoff * 2 ** (reply.attempts - 1)
+			LOG.warning('Reply to {} failed (attempt {}): {!r}'.format(
+				reply.fullname, reply.attempts, error))
+		reply.save()
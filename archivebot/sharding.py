@@ -0,0 +1,326 @@
+"""
+Spreads ads and archives over several sqlite databases.
+
+sqlite only allows one writer per file, so with several workers writing
+archives at once, one database becomes the bottleneck. A `ShardRouter` sends
+each ad (and its archives) to one of several database files, chosen either
+by hashing the post id or by the ad's Craigslist region.
+
+Shards can be rebalanced (e.g. after adding a shard) with:
+
+	python -m archivebot.sharding rebalance --from a.db b.db --to a.db b.db c.db
+"""
+import os
+import zlib
+import logging
+import argparse
+from urllib.parse import urlparse
+
+from peewee import SqliteDatabase, ForeignKeyField
+
+from .custommodels import CraigslistAd, AdCache, Archive, trusted_load
+
+
+LOG = logging.getLogger(__name__)
+
+STRATEGIES = ('post_id', 'region')
+
+
+def region_from_url(url):
+	"""
+	Get the Craigslist region (subdomain) out of an ad url.
+
+	Args:
+		url (String): e.g. https://indianapolis.craigslist.org/bar/d/bears/6451661128.html
+	Returns:
+		String
+
+		e.g. `indianapolis`
+	"""
+	return (urlparse(url).hostname or '').split('.')[0]
+
+
+class Shard(object):
+	"""
+	A single database file, and copies of the models that use it.
+
+	The models are subclasses of `CraigslistAd`, `AdCache` and `Archive`
+	with the same tables, so they behave the same way, but read and write
+	this shard's database.
+
+	Args:
+		path (String): The path to the sqlite database
+	"""
+	def __init__(self, path):
+		super(Shard, self).__init__()
+		self.path = path
+		self.database = SqliteDatabase(path)
+		self.CraigslistAd = self._bind(CraigslistAd)
+		self.AdCache = self._bind(AdCache)
+		# The foreign key has to point at this shard's ads, not the originals.
+		self.Archive = self._bind(Archive, ad=ForeignKeyField(self.CraigslistAd))
+		self.models = [self.CraigslistAd, self.AdCache, self.Archive]
+
+	def create_tables(self):
+		self.database.create_tables(self.models, safe=True)
+
+	def close(self):
+		if not self.database.is_closed():
+			self.database.close()
+
+	def model_for(self, instance):
+		"""Returns this shard's version of the model `instance` is from"""
+		for model in self.models:
+			if isinstance(instance, model.__bases__[0]):
+				return model
+		raise TypeError('{} is not a sharded model'.format(type(instance).__name__))
+
+	def _bind(self, model, **fields):
+		meta = type('Meta', (), {'database': self.database, 'db_table': model._meta.db_table})
+		attrs = dict(fields, Meta=meta, __module__=__name__)
+		return type(model.__name__, (model,), attrs)
+
+	def __repr__(self):
+		return 'Shard({!r})'.format(self.path)
+
+
+class ShardRouter(object):
+	"""
+	Sends reads and writes for an ad to the shard it belongs on.
+
+	Args:
+		paths (List): One sqlite database per shard
+	Kwargs:
+		by (String): `post_id` to spread ads evenly by hashed post id, or
+			`region` to keep every ad from a Craigslist region together.
+		regions (Dict): Region => shard index, to pin busy regions to a
+			shard of their own. Other regions are hashed. Only used when
+			sharding by region.
+	"""
+	def __init__(self, paths, by='post_id', regions=None):
+		super(ShardRouter, self).__init__()
+		if by not in STRATEGIES:
+			raise ValueError('Unknown sharding strategy: {}'.format(by))
+		if not paths:
+			raise ValueError('At least one shard is needed')
+		self.by = by
+		self.regions = regions or {}
+		self.shards = [Shard(pth) for pth in paths]
+
+	def create_tables(self):
+		for shard in self.shards:
+			shard.create_tables()
+
+	def close(self):
+		for shard in self.shards:
+			shard.close()
+
+	def shard_for(self, post_id=None, url=None):
+		"""
+		Find the shard an ad belongs on.
+
+		Kwargs:
+			post_id (String): Needed when sharding by post id
+			url (String): Needed when sharding by region
+		Returns:
+			Shard
+		"""
+		if self.by == 'region':
+			region = region_from_url(url)
+			if region in self.regions:
+				return self.shards[self.regions[region]]
+			key = region
+		else:
+			key = post_id
+		# crc32 rather than `hash`, which changes between runs.
+		return self.shards[zlib.crc32(key.encode()) % len(self.shards)]
+
+	def save(self, instance):
+		"""
+		Save an ad or archive to its shard.
+
+		Ads and archives created from the plain models in `custommodels` are
+		copied to the shard's models first. An archive's ad is saved with it.
+		A row the shard already has for the same ad is updated rather than
+		added again.
+
+		Args:
+			instance ([CraigslistAd, AdCache, Archive]):
+		Returns:
+			The saved shard instance
+		"""
+		ad = instance.ad if isinstance(instance, Archive) else instance
+		shard = self.shard_for(ad.post_id, ad.url)
+		with shard.database.atomic():
+			if isinstance(instance, Archive):
+				ad_copy = _copy_to(shard, ad)
+				ad_copy.save()
+				copy = _copy_to(shard, instance, ad=ad_copy)
+			else:
+				copy = _copy_to(shard, instance)
+			copy.save()
+		return copy
+
+	def get_ad(self, post_id, url=None):
+		"""
+		Look up an ad by post id.
+
+		Goes straight to the right shard when it can be worked out, and
+		checks every shard otherwise (sharding by region without a url).
+
+		Raises:
+			CraigslistAd.DoesNotExist
+		"""
+		return self._get('CraigslistAd', post_id, url)
+
+	def get_archive(self, post_id, url=None):
+		"""
+		Look up the archive of an ad by the ad's post id.
+
+		Raises:
+			Archive.DoesNotExist
+		"""
+		return self._get('Archive', post_id, url)
+
+	def fan_out(self, query):
+		"""
+		Run a query on every shard and chain the results together.
+
+		Args:
+			query (Callable): Takes a Shard and returns an iterable of results,
+				e.g. `lambda shard: shard.Archive.select()`
+		Returns:
+			Generator
+		"""
+		for shard in self.shards:
+			for result in query(shard):
+				yield result
+
+	def _get(self, model_name, post_id, url):
+		if self.by == 'post_id' or url is not None:
+			shards = [self.shard_for(post_id, url)]
+		else:
+			shards = self.shards
+		for shard in shards:
+			try:
+				return self._lookup(shard, model_name, post_id)
+			except getattr(shard, model_name).DoesNotExist:
+				continue
+		model = {'CraigslistAd': CraigslistAd, 'Archive': Archive}[model_name]
+		raise model.DoesNotExist('No {} for post id {}'.format(model_name, post_id))
+
+	def _lookup(self, shard, model_name, post_id):
+		with trusted_load():
+			if model_name == 'Archive':
+				return (shard.Archive.select(shard.Archive, shard.CraigslistAd)
+					.join(shard.CraigslistAd)
+					.where(shard.CraigslistAd.post_id == post_id)
+					.get())
+			return shard.CraigslistAd.get(shard.CraigslistAd.post_id == post_id)
+
+
+def _copy_to(shard, instance, ad=None):
+	"""
+	Copy an ad or archive into `shard`'s version of its model.
+
+	Instances that already belong to the shard are returned as they are.
+	An archive's ad is copied along with it, unless `ad` is given.
+
+	If the shard already has a row for the same ad (looked up by post id,
+	or by ad for archives), the copy takes its id, so saving it updates that
+	row instead of adding a duplicate.
+	"""
+	model = shard.model_for(instance)
+	if type(instance) is model:
+		return instance
+	values = {}
+	for name in model._meta.fields:
+		if name in ('id', 'ad'):
+			continue
+		values[name] = getattr(instance, name)
+	if model is shard.Archive:
+		values['ad'] = ad if ad is not None else _copy_to(shard, instance.ad)
+		existing = None
+		if values['ad'].id is not None:
+			existing = model.select(model.id).where(model.ad == values['ad'].id).first()
+	else:
+		existing = model.select(model.id).where(model.post_id == values['post_id']).first()
+	if existing is not None:
+		values['id'] = existing.id
+	with trusted_load():
+		return model(**values)
+
+
+def rebalance(source, target):
+	"""
+	Move every ad and archive to the shard `target` says it belongs on.
+
+	Rows that are already on the right shard are left alone, so the
+	same database files can appear in both routers.
+
+	Args:
+		source (ShardRouter): Where the rows are now
+		target (ShardRouter): Where they should be
+	Returns:
+		Int
+
+		The number of ads moved.
+	"""
+	target.create_tables()
+	moved = 0
+	for shard in source.shards:
+		with trusted_load():
+			ads = list(shard.CraigslistAd.select())
+			caches = list(shard.AdCache.select())
+		for ad in ads + caches:
+			dest = target.shard_for(ad.post_id, ad.url)
+			if _same_file(dest.path, shard.path):
+				continue
+			archives = []
+			if isinstance(ad, shard.CraigslistAd):
+				with trusted_load():
+					archives = list(shard.Archive.select().where(shard.Archive.ad == ad))
+			# Copied before deleting, so a crash part way through leaves a
+			# row in both shards rather than in neither.
+			with dest.database.atomic():
+				copy = _copy_to(dest, ad)
+				copy.save()
+				for archive in archives:
+					_copy_to(dest, archive, ad=copy).save()
+			with shard.database.atomic():
+				for archive in archives:
+					archive.delete_instance()
+				ad.delete_instance()
+			moved += 1
+		LOG.info('Rebalanced {}'.format(shard.path))
+	return moved
+
+
+def _same_file(a, b):
+	return os.path.abspath(a) == os.path.abspath(b)
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Manage sharded archive databases.')
+	subparsers = parser.add_subparsers(dest='command')
+	parser_rebalance = subparsers.add_parser('rebalance', help='move rows to the shard they belong on')
+	parser_rebalance.add_argument('--from', dest='source', nargs='+', required=True)
+	parser_rebalance.add_argument('--to', dest='target', nargs='+', required=True)
+	parser_rebalance.add_argument('--by', choices=STRATEGIES, default='post_id')
+	args = parser.parse_args(argv)
+	if args.command != 'rebalance':
+		parser.print_help()
+		return 1
+	source = ShardRouter(args.source, by=args.by)
+	target = ShardRouter(args.target, by=args.by)
+	try:
+		print('Moved {} ads'.format(rebalance(source, target)))
+	finally:
+		source.close()
+		target.close()
+	return 0
+
+
+if __name__ == '__main__':
+	logging.basicConfig(level=logging.INFO)
+	raise SystemExit(main())
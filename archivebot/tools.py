@@ -0,0 +1,329 @@
+import os
+import re
+import base64
+import queue
+import logging
+import tempfile
+import threading
+
+from .errors import SnapshotTimeoutError
+
+
+LOG = logging.getLogger(__name__)
+
+
+class Renderer(object):
+	"""
+	A long-lived browser instance that the Camera takes snapshots with.
+
+	Starting a browser takes seconds, so a renderer is started once and then
+	reused for many jobs. Each job gets its own page, which is closed as soon
+	as the snapshot has been saved.
+	"""
+	def new_page(self):
+		"""
+		Open a new blank page.
+
+		Returns:
+			Object
+
+			A page with `goto(url)`, `set_content(html, base_url)`,
+			`screenshot(dest)` and `close()` methods.
+		"""
+		raise NotImplementedError
+
+	def close(self):
+		"""Shut down the browser."""
+		raise NotImplementedError
+
+
+class ChromeRenderer(Renderer):
+	"""
+	Headless Chrome, driven through selenium.
+
+	selenium (and chromedriver) are only needed if this renderer is used, so
+	selenium is imported when the renderer is started rather than at the top
+	of the module.
+
+	Kwargs:
+		width (Int): The width of the browser window in pixels. The height
+			of a snapshot is always the full height of the page.
+	"""
+	def __init__(self, width=1280):
+		super(ChromeRenderer, self).__init__()
+		from selenium import webdriver
+		options = webdriver.ChromeOptions()
+		options.add_argument('--headless=new')
+		options.add_argument('--window-size={},1024'.format(width))
+		self._driver = webdriver.Chrome(options=options)
+
+	def new_page(self):
+		self._driver.switch_to.new_window('tab')
+		return _ChromePage(self._driver)
+
+	def close(self):
+		self._driver.quit()
+
+
+class _ChromePage(object):
+	def __init__(self, driver):
+		super(_ChromePage, self).__init__()
+		self._driver = driver
+
+	def goto(self, url):
+		self._driver.get(url)
+
+	def set_content(self, html, base_url):
+		# A <base> tag lets relative images and stylesheets load from the
+		# original site, as if the page had been requested normally.
+		base = '<base href="{}">'.format(base_url)
+		html, found = re.subn(r'(<head[^>]*>)', r'\1' + base, html, count=1, flags=re.I)
+		if not found:
+			html = base + html
+		self._driver.get('about:blank')
+		self._driver.execute_script(
+			'document.open(); document.write(arguments[0]); document.close();', html)
+
+	def screenshot(self, dest):
+		size = self._driver.execute_cdp_cmd('Page.getLayoutMetrics', {})['contentSize']
+		clip = {'x': 0, 'y': 0, 'width': size['width'], 'height': size['height'], 'scale': 1}
+		shot = self._driver.execute_cdp_cmd(
+			'Page.captureScreenshot',
+			{'format': 'png', 'captureBeyondViewport': True, 'clip': clip}
+			)
+		with open(dest, 'wb') as f:
+			f.write(base64.b64decode(shot['data']))
+
+	def close(self):
+		self._driver.close()
+		self._driver.switch_to.window(self._driver.window_handles[0])
+
+
+class StubRenderer(Renderer):
+	"""
+	Renderer that doesn't render anything. Used for testing.
+
+	Every page load is recorded in `loaded` as a tuple of
+	('url', url) or ('html', base_url).
+
+	Kwargs:
+		delay (Float): Seconds each screenshot should take
+	"""
+	def __init__(self, delay=0):
+		super(StubRenderer, self).__init__()
+		self.delay = delay
+		self.loaded = []
+		self.pages_opened = 0
+		self.closed = False
+
+	def new_page(self):
+		self.pages_opened += 1
+		return _StubPage(self)
+
+	def close(self):
+		self.closed = True
+
+
+class _StubPage(object):
+	def __init__(self, renderer):
+		super(_StubPage, self).__init__()
+		self._renderer = renderer
+
+	def goto(self, url):
+		self._renderer.loaded.append(('url', url))
+
+	def set_content(self, html, base_url):
+		self._renderer.loaded.append(('html', base_url))
+
+	def screenshot(self, dest):
+		if self._renderer.delay:
+			threading.Event().wait(self._renderer.delay)
+		with open(dest, 'wb') as f:
+			f.write(b'stub snapshot')
+
+	def close(self):
+		pass
+
+
+class _Instance(object):
+	def __init__(self, renderer):
+		super(_Instance, self).__init__()
+		self.renderer = renderer
+		self.jobs = 0
+
+
+class Camera(object):
+	"""
+	Takes full-page snapshots of Craigslist ads using a pool of renderers.
+
+	Renderers are started up front and kept warm between jobs. Each job
+	borrows an idle renderer, so `instances` is also the number of snapshots
+	that can be taken at the same time; any more callers wait their turn.
+	A renderer is replaced after `max_jobs` snapshots to keep browser memory
+	from growing, or straight away if a job runs past `timeout`.
+
+	Args:
+		renderer_factory (Callable): Returns a new, started `Renderer`
+	Kwargs:
+		instances (Int): The number of renderers in the pool
+		timeout (Float): Seconds a single snapshot may take
+		max_jobs (Int): The number of snapshots a renderer takes before
+			being replaced with a fresh one.
+		tmp_dir (String): Where snapshots are saved when no destination is
+			given. Defaults to the system temp folder.
+		wait_timeout (Float): Seconds to wait for a free renderer before
+			giving up. Defaults to twice `timeout`.
+	"""
+	def __init__(self, renderer_factory, instances=2, timeout=30, max_jobs=100, tmp_dir=None, wait_timeout=None):
+		super(Camera, self).__init__()
+		self.renderer_factory = renderer_factory
+		self.timeout = timeout
+		self.wait_timeout = wait_timeout if wait_timeout is not None else timeout * 2
+		self.max_jobs = max_jobs
+		self.tmp_dir = tmp_dir
+		self._closed = False
+		self._idle = queue.Queue()
+		for _ in range(instances):
+			self._idle.put(_Instance(renderer_factory()))
+
+	def take_snapshot(self, url, html=None, dest=None):
+		"""
+		Save a full-page snapshot of an ad.
+
+		Args:
+			url (String): The url of the ad
+		Kwargs:
+			html (String): The html source of the ad, if it has already been
+				downloaded (see `bot.request_page`). The page is rendered from
+				the source instead of being requested a second time.
+			dest (String): Where to save the snapshot. A temporary file is
+				created if not given.
+		Returns:
+			String
+
+			The path to the saved snapshot.
+		Raises:
+			SnapshotTimeoutError: If the snapshot takes longer than `timeout`,
+				or no renderer is free within `wait_timeout`.
+		"""
+		instance = self._acquire()
+		temporary = dest is None
+		if temporary:
+			fd, dest = tempfile.mkstemp(suffix='.png', prefix='snapshot-', dir=self.tmp_dir)
+			os.close(fd)
+		try:
+			return self._take(instance, url, html, dest)
+		except Exception:
+			if temporary:
+				_remove(dest)
+			raise
+
+	def _take(self, instance, url, html, dest):
+		result = {}
+		job = threading.Thread(
+			target=self._shoot, args=(instance, url, html, dest, result), daemon=True)
+		job.start()
+		job.join(self.timeout)
+		if job.is_alive():
+			msg = 'Snapshot took longer than {} seconds: {}'.format(self.timeout, url)
+			LOG.error(msg)
+			# The renderer is stuck, so it can't go back into the pool.
+			self._replace(instance)
+			raise SnapshotTimeoutError(msg)
+
+		instance.jobs += 1
+		if result.get('renderer_failed'):
+			LOG.error('Renderer failed, replacing it')
+			self._replace(instance)
+		elif instance.jobs >= self.max_jobs:
+			LOG.info('Recycling renderer after {} snapshots'.format(instance.jobs))
+			self._replace(instance)
+		else:
+			self._release(instance)
+		if 'error' in result:
+			raise result['error']
+		LOG.info('Snapshot taken: {}'.format(url))
+		return dest
+
+	def close(self):
+		"""Shut down every renderer in the pool."""
+		self._closed = True
+		while True:
+			try:
+				instance = self._idle.get_nowait()
+			except queue.Empty:
+				break
+			self._close_renderer(instance.renderer)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def _shoot(self, instance, url, html, dest, result):
+		page = None
+		try:
+			page = instance.renderer.new_page()
+			if html is None:
+				page.goto(url)
+			else:
+				page.set_content(html, base_url=url)
+			page.screenshot(dest)
+		except Exception as e:
+			result['error'] = e
+			# Not being able to open a page means the browser itself is broken.
+			result['renderer_failed'] = page is None
+		finally:
+			if page is not None:
+				page.close()
+
+	def _acquire(self):
+		try:
+			instance = self._idle.get(timeout=self.wait_timeout)
+		except queue.Empty:
+			msg = 'No renderer free after {} seconds'.format(self.wait_timeout)
+			LOG.error(msg)
+			raise SnapshotTimeoutError(msg)
+		if instance.renderer is None:
+			# A replacement that failed to start earlier; try again.
+			try:
+				instance.renderer = self.renderer_factory()
+			except Exception:
+				self._idle.put(instance)
+				raise
+		return instance
+
+	def _release(self, instance):
+		if self._closed:
+			self._close_renderer(instance.renderer)
+		else:
+			self._idle.put(instance)
+
+	def _replace(self, instance):
+		self._close_renderer(instance.renderer)
+		if self._closed:
+			return
+		try:
+			renderer = self.renderer_factory()
+		except Exception:
+			# The slot stays in the pool without a renderer, and the next job
+			# to get it starts one, rather than the pool shrinking for good.
+			LOG.exception('Could not start a replacement renderer')
+			renderer = None
+		self._idle.put(_Instance(renderer))
+
+	def _close_renderer(self, renderer):
+		if renderer is None:
+			return
+		try:
+			renderer.close()
+		except Exception:
+			LOG.exception('Could not close renderer')
+
+
+def _remove(pth):
+	try:
+		os.remove(pth)
+	except OSError:
+		pass
@@ -0,0 +1,83 @@
+"""
+Import-time benchmark for the bot's modules.
+
+Each module is imported in a fresh interpreter several times and the median
+is reported, so regressions in startup time (a heavy import creeping back
+into module scope) show up as a jump in the numbers.
+
+	python bench/import_time.py
+	python bench/import_time.py --max-ms 150      # fail if any module is slower
+	python bench/import_time.py --top 10          # show the slowest imports
+"""
+import sys
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+
+ROOT = Path(__file__).resolve().parent.parent
+MODULES = [
+	'archivebot.bot',
+	'archivebot.craigslist',
+	'archivebot.custommodels',
+	'archivebot.imgur',
+	'archivebot.tools',
+	]
+TIMER = 'import time; t = time.perf_counter(); import {}; print(time.perf_counter() - t)'
+
+
+def time_import(module, runs):
+	"""Returns the median import time of `module`, in milliseconds"""
+	times = []
+	for _ in range(runs):
+		out = subprocess.check_output(
+			[sys.executable, '-c', TIMER.format(module)], cwd=ROOT, text=True)
+		times.append(float(out) * 1000)
+	return statistics.median(times)
+
+
+def import_tree(code):
+	"""Returns {module: cumulative ms} for every import made running `code`"""
+	proc = subprocess.run(
+		[sys.executable, '-X', 'importtime', '-c', code],
+		cwd=ROOT, text=True, capture_output=True, check=True)
+	tree = {}
+	for line in proc.stderr.splitlines():
+		if not line.startswith('import time:') or 'cumulative' in line:
+			continue
+		_, cumulative, name = line[len('import time:'):].split('|')
+		tree[name.strip()] = int(cumulative) / 1000
+	return tree
+
+
+def slowest_imports(module, top):
+	"""Returns the `top` slowest imports (cumulative) made by `module`"""
+	# Leave out whatever the interpreter imports on startup (site, etc.)
+	startup = import_tree('pass')
+	tree = import_tree('import {}'.format(module))
+	rows = [(ms, name) for name, ms in tree.items() if name not in startup]
+	return sorted(rows, reverse=True)[:top]
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Measure import time of the bot modules.')
+	parser.add_argument('modules', nargs='*', default=MODULES)
+	parser.add_argument('--runs', type=int, default=7)
+	parser.add_argument('--max-ms', type=float, help='exit with an error if a module is slower')
+	parser.add_argument('--top', type=int, default=0, help='show the slowest imports of each module')
+	args = parser.parse_args()
+
+	failed = False
+	for module in args.modules:
+		ms = time_import(module, args.runs)
+		too_slow = args.max_ms is not None and ms > args.max_ms
+		failed = failed or too_slow
+		print('{:<28} {:8.1f}ms{}'.format(module, ms, '  SLOW' if too_slow else ''))
+		for cumulative, name in slowest_imports(module, args.top):
+			print('    {:<40} {:8.1f}ms'.format(name, cumulative))
+	return 1 if failed else 0
+
+
+if __name__ == '__main__':
+	sys.exit(main())
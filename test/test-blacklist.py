@@ -0,0 +1,148 @@
+import unittest
+import logging
+import tempfile
+from pathlib import Path
+from unittest.mock import Mock
+
+from archivebot.blacklist import Blacklist, BlacklistManager, FileRules
+
+
+# disable application logging during tests
+logging.disable(logging.CRITICAL)
+
+
+def make_post(subreddit='pics', author='someone', text=''):
+	return Mock(subreddit=subreddit, author=author, text=text)
+
+
+class TestBlacklist(unittest.TestCase):
+	def setUp(self):
+		self.blacklist = Blacklist(
+			subreddits=['AskReddit'], users=['SpamBot'],
+			url_patterns=['forums.craigslist.org', '*.craigslist.org/about'])
+
+	def test_Blocks_GivenBlacklistedSubreddit_ReturnsTrue(self):
+		self.assertTrue(self.blacklist.blocks(make_post(subreddit='askreddit')))
+
+	def test_Blocks_GivenBlacklistedUser_ReturnsTrue(self):
+		self.assertTrue(self.blacklist.blocks(make_post(author='spambot')))
+
+	def test_Blocks_GivenBlacklistedUrl_ReturnsTrue(self):
+		post = make_post(text='see https://forums.craigslist.org/?forumID=3')
+		self.assertTrue(self.blacklist.blocks(post))
+
+	def test_Blocks_GivenWildcardUrlPattern_ReturnsTrue(self):
+		post = make_post(text='see https://www.craigslist.org/about/scams')
+		self.assertTrue(self.blacklist.blocks(post))
+
+	def test_Blocks_GivenDeletedAuthor_ReturnsFalse(self):
+		self.assertFalse(self.blacklist.blocks(make_post(author=None)))
+
+	def test_Blocks_GivenCleanPost_ReturnsFalse(self):
+		post = make_post(text='https://indianapolis.craigslist.org/bar/d/bears/6451661128.html')
+		self.assertFalse(self.blacklist.blocks(post))
+
+	def test_Blocks_GivenEmptyBlacklist_ReturnsFalse(self):
+		self.assertFalse(Blacklist().blocks(make_post(text='anything')))
+
+	def test_Blocks_GivenOnlyWildcardUrlPattern_IgnoresPattern(self):
+		blacklist = Blacklist(url_patterns=['*', '**'])
+		self.assertFalse(blacklist.blocks(make_post(subreddit='other', author='other', text='plain text')))
+		self.assertEqual(len(blacklist), 0)
+
+	def test_FromRules_GivenRules_SortsRulesByKind(self):
+		blacklist = Blacklist.from_rules([('subreddit', 'a'), ('user', 'b'), ('url', 'c')])
+		self.assertEqual(blacklist.subreddits, {'a'})
+		self.assertEqual(blacklist.users, {'b'})
+		self.assertEqual(blacklist.url_patterns, ('c',))
+
+
+class TestFileRules(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+		self.path = Path(self.tmp.name) / 'blacklist.txt'
+
+	def tearDown(self):
+		self.tmp.cleanup()
+
+	def test_Load_GivenMissingFile_ReturnsNoRules(self):
+		self.assertEqual(FileRules(str(self.path)).load(), [])
+
+	def test_Load_GivenCommentsAndBlankLines_IgnoresThem(self):
+		self.path.write_text('# comment\n\nsubreddit pics\n')
+		self.assertEqual(FileRules(str(self.path)).load(), [('subreddit', 'pics')])
+
+	def test_Load_GivenInvalidKind_IgnoresRule(self):
+		self.path.write_text('domain example.com\nuser someone\n')
+		self.assertEqual(FileRules(str(self.path)).load(), [('user', 'someone')])
+
+	def test_Load_GivenOnlyWildcardUrlPattern_IgnoresRule(self):
+		self.path.write_text('url *\nurl example.com\n')
+		self.assertEqual(FileRules(str(self.path)).load(), [('url', 'example.com')])
+
+	def test_AddThenRemove_LeavesNoRules(self):
+		rules = FileRules(str(self.path))
+		rules.add('user', 'someone')
+		rules.remove('user', 'someone')
+		self.assertEqual(rules.load(), [])
+
+
+	def test_Remove_GivenDifferentCase_RemovesRule(self):
+		self.path.write_text('subreddit AskReddit\n')
+		rules = FileRules(str(self.path))
+		rules.remove('subreddit', 'askreddit')
+		self.assertEqual(rules.load(), [])
+
+
+class TestBlacklistManager(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+		self.rules = FileRules(str(Path(self.tmp.name) / 'blacklist.txt'))
+		self.manager = BlacklistManager(self.rules, admins=['moderator'])
+
+	def tearDown(self):
+		self.tmp.cleanup()
+
+	def test_HandleMessage_FromAdmin_BlacklistsImmediately(self):
+		message = Mock(author='Moderator', body='blacklist subreddit pics')
+		self.manager.handle_message(message)
+		self.assertTrue(self.manager.blocks(make_post(subreddit='pics')))
+
+	def test_HandleMessage_GivenUnblacklist_RemovesRule(self):
+		self.manager.handle_message(Mock(author='moderator', body='blacklist subreddit pics'))
+		self.manager.handle_message(Mock(author='moderator', body='unblacklist subreddit pics'))
+		self.assertFalse(self.manager.blocks(make_post(subreddit='pics')))
+
+	def test_HandleMessage_GivenUnblacklistInDifferentCase_RemovesRule(self):
+		self.manager.handle_message(Mock(author='someone', body='blacklist user Someone'))
+		applied = self.manager.handle_message(Mock(author='someone', body='unblacklist user someone'))
+		self.assertEqual(len(applied), 1)
+		self.assertFalse(self.manager.blocks(make_post(author='Someone')))
+
+	def test_HandleMessage_GivenOnlyWildcardUrlPattern_IsIgnored(self):
+		applied = self.manager.handle_message(Mock(author='moderator', body='blacklist url *'))
+		self.assertEqual(applied, [])
+		self.assertEqual(self.rules.load(), [])
+
+	def test_HandleMessage_FromUserForThemselves_BlacklistsUser(self):
+		self.manager.handle_message(Mock(author='someone', body='blacklist user someone'))
+		self.assertTrue(self.manager.blocks(make_post(author='someone')))
+
+	def test_HandleMessage_FromUserForSubreddit_IsIgnored(self):
+		applied = self.manager.handle_message(Mock(author='someone', body='blacklist subreddit pics'))
+		self.assertEqual(applied, [])
+		self.assertFalse(self.manager.blocks(make_post(subreddit='pics')))
+
+	def test_HandleMessage_GivenSeveralCommands_AppliesAll(self):
+		body = 'blacklist subreddit pics\nblacklist url example.com'
+		applied = self.manager.handle_message(Mock(author='moderator', body=body))
+		self.assertEqual(len(applied), 2)
+
+	def test_Reload_AfterRulesChangedOnDisk_PicksUpNewRules(self):
+		self.rules.add('user', 'spambot')
+		self.manager.reload()
+		self.assertTrue(self.manager.blocks(make_post(author='spambot')))
+
+
+if __name__ == '__main__':
+	unittest.main()
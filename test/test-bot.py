@@ -97,6 +97,34 @@ class TestBot(unittest.TestCase):
 		post = bot.RedditPost(self.mock_comment)
 		self.assertEqual(post.text, self.mock_comment.body)
 
+	def test_RedditPost_GivenPost_PullsSubredditAndAuthorNames(self):
+		post = bot.RedditPost(Mock(body='xyz', subreddit='pics', author='someone'))
+		self.assertEqual(post.subreddit, 'pics')
+		self.assertEqual(post.author, 'someone')
+
+	def test_RedditPost_GivenDeletedAuthor_HasNoAuthor(self):
+		post = bot.RedditPost(Mock(body='xyz', subreddit='pics', author=None))
+		self.assertIsNone(post.author)
+
+	def test_RedditPost_GivenSubmission_UsesIdAsThreadId(self):
+		self.mock_submission.id = 'abc123'
+		post = bot.RedditPost(self.mock_submission)
+		self.assertEqual(post.thread_id, 'abc123')
+
+	def test_RedditPost_GivenComment_UsesSubmissionAsThreadId(self):
+		self.mock_comment.link_id = 't3_abc123'
+		post = bot.RedditPost(self.mock_comment)
+		self.assertEqual(post.thread_id, 'abc123')
+
+	def test_RedditPost_GivenSubmission_ThreadCreatedIsSubmissionTime(self):
+		self.mock_submission.created_utc = 100
+		self.assertEqual(bot.RedditPost(self.mock_submission).thread_created, 100)
+
+	def test_RedditPost_GivenComment_ThreadCreatedIsSubmissionTime(self):
+		self.mock_comment.created_utc = 200
+		self.mock_comment.submission.created_utc = 100
+		self.assertEqual(bot.RedditPost(self.mock_comment).thread_created, 100)
+
 	def test_RedditPost_ReplyToSubmission_CallsPrawReply(self):
 		post = bot.RedditPost(self.mock_submission)
 		post.reply('')
@@ -132,6 +160,12 @@ class TestPageRequest(unittest.TestCase):
 			with self.assertRaises(bot.PageUnavailableError):
 				bot.request_page(self.url)
 
+	def test_RequestPage_GivenSession_RequestsThroughSession(self):
+		session = Mock()
+		session.get.return_value = Mock(ok=True, text='<html source>')
+		self.assertEqual('<html source>', bot.request_page(self.url, session=session))
+		session.get.assert_called_with(self.url)
+
 
 class TestFormat(unittest.TestCase):
 	def setUp(self):
@@ -266,5 +300,136 @@ class TestFormat(unittest.TestCase):
 		self.assertEqual(expected_reply, formatter.format(a))
 
 
+class TestFormatMany(unittest.TestCase):
+	def setUp(self):
+		self.archives = []
+		for i in range(2):
+			ad = custommodels.CraigslistAd(
+				title='Post title {}'.format(i), post_id='123456789{}'.format(i),
+				body='Post description {}.'.format(i),
+				url='http://indianapolis.craigslist.org/bar/d/bears/123456789{}.html'.format(i),
+				)
+			archive = custommodels.Archive(
+				url='https://imgur.com/a/zzzz{}'.format(i), title='xxx',
+				ad=ad, screenshot='https://i.imgur.com/abcd000.jpg', images=[])
+			self.archives.append(archive)
+
+	def test_FormatMany_GivenOneArchive_MatchesFormat(self):
+		formatter = bot.PostFormatter()
+		self.assertEqual(formatter.format_many(self.archives[:1]), formatter.format(self.archives[0]))
+
+	def test_FormatMany_GivenSeveralArchives_FormatsEachSection(self):
+		reply = bot.PostFormatter().format_many(self.archives)
+		self.assertIn('> ### Post title 0 ###', reply)
+		self.assertIn('> ### Post title 1 ###', reply)
+		self.assertIn('[imgur album](https://imgur.com/a/zzzz1)', reply)
+
+	def test_FormatMany_GivenSeveralArchives_HasOneFooter(self):
+		reply = bot.PostFormatter().format_many(self.archives)
+		self.assertEqual(reply.count('[^github]'), 1)
+
+	def test_FormatMany_GivenLongBodies_FitsInOneComment(self):
+		archives = deepcopy(self.archives)
+		for archive in archives:
+			archive.ad.body = 'word ' * 3000
+		formatter = bot.PostFormatter()
+		reply = formatter.format_many(archives)
+		self.assertLessEqual(len(reply), formatter.max_length)
+		self.assertIn('> ### Post title 1 ###', reply)
+
+	def test_FormatFitting_GivenTooManyArchives_ReturnsOnlyThoseIncluded(self):
+		archives = [deepcopy(self.archives[i % 2]) for i in range(100)]
+		for i, archive in enumerate(archives):
+			archive.ad.title = 'Ad {}'.format(i)
+		formatter = bot.PostFormatter()
+		reply, included = formatter.format_fitting(archives)
+		self.assertLessEqual(len(reply), formatter.max_length)
+		self.assertLess(len(included), 100)
+		self.assertEqual(reply.count('> ### Ad '), len(included))
+
+	def test_Format_GivenManyImages_CapsImageList(self):
+		archive = deepcopy(self.archives[0])
+		archive.images = ['https://i.imgur.com/abcd{:03d}.jpg'.format(i) for i in range(400)]
+		formatter = bot.PostFormatter()
+		reply = formatter.format(archive)
+		self.assertLessEqual(len(reply), formatter.max_length)
+		self.assertIn('[image 1](https://i.imgur.com/abcd000.jpg)', reply)
+		self.assertIn('more in the album', reply)
+
+
+class TestReplyCoalescer(unittest.TestCase):
+	def setUp(self):
+		self.now = 1000
+		self.coalescer = bot.ReplyCoalescer(window=60, clock=lambda: self.now)
+		self.post = Mock(thread_id='abc123')
+		self.archives = []
+		for i in range(2):
+			ad = custommodels.CraigslistAd(
+				title='Post title {}'.format(i), post_id='123456789{}'.format(i),
+				body='Post description.', url='a_url')
+			self.archives.append(custommodels.Archive(
+				url='https://imgur.com/a/zzzz{}'.format(i), title='xxx',
+				ad=ad, screenshot='https://i.imgur.com/abcd000.jpg', images=[]))
+
+	def test_Coalesce_GivenSeveralArchives_ReturnsOneReply(self):
+		reply = self.coalescer.coalesce(self.post, self.archives)
+		self.assertIn('Post title 0', reply)
+		self.assertIn('Post title 1', reply)
+
+	def test_Coalesce_GivenSameAdTwice_FormatsItOnce(self):
+		reply = self.coalescer.coalesce(self.post, self.archives[:1] * 2)
+		self.assertEqual(reply.count('### Post title 0 ###'), 1)
+
+	def test_Coalesce_WhenThreadAlreadyAnswered_ReturnsNone(self):
+		self.coalescer.coalesce(self.post, self.archives)
+		self.assertIsNone(self.coalescer.coalesce(Mock(thread_id='abc123'), self.archives))
+
+	def test_Coalesce_WhenThreadAnsweredForOtherAd_RepliesWithNewAdOnly(self):
+		self.coalescer.coalesce(self.post, self.archives[:1])
+		reply = self.coalescer.coalesce(self.post, self.archives)
+		self.assertNotIn('Post title 0', reply)
+		self.assertIn('Post title 1', reply)
+
+	def test_Coalesce_InDifferentThread_Replies(self):
+		self.coalescer.coalesce(self.post, self.archives)
+		self.assertIsNotNone(self.coalescer.coalesce(Mock(thread_id='def456'), self.archives))
+
+	def test_Coalesce_AfterWindow_RepliesAgain(self):
+		self.coalescer.coalesce(self.post, self.archives)
+		self.now += 61
+		self.assertIsNotNone(self.coalescer.coalesce(self.post, self.archives))
+
+	def test_Coalesce_PastMaxBytes_ForgetsOldestAnswers(self):
+		coalescer = bot.ReplyCoalescer(window=60, clock=lambda: self.now, max_bytes=500)
+		for i in range(20):
+			coalescer.coalesce(Mock(thread_id='thread{}'.format(i)), self.archives)
+		self.assertLessEqual(coalescer._answered.bytes, 500)
+		self.assertIsNotNone(coalescer.coalesce(Mock(thread_id='thread0'), self.archives))
+
+	def _many_archives(self, count):
+		archives = []
+		for i in range(count):
+			archive = deepcopy(self.archives[0])
+			archive.ad.post_id = '12345{:05d}'.format(i)
+			archive.ad.title = 'Ad {}'.format(i)
+			archives.append(archive)
+		return archives
+
+	def test_Coalesce_GivenMoreAdsThanFit_LeavesRestForFollowUp(self):
+		archives = self._many_archives(100)
+		first = self.coalescer.coalesce(self.post, archives)
+		second = self.coalescer.coalesce(self.post, archives)
+		self.assertIn('> ### Ad 0 ###', first)
+		self.assertIsNotNone(second)
+		self.assertNotIn('> ### Ad 0 ###', second)
+
+	def test_CoalesceAll_GivenMoreAdsThanFit_CoversEveryAd(self):
+		archives = self._many_archives(100)
+		replies = self.coalescer.coalesce_all(self.post, archives)
+		self.assertGreater(len(replies), 1)
+		self.assertEqual(sum(reply.count('> ### Ad ') for reply in replies), 100)
+		self.assertEqual(self.coalescer.coalesce_all(self.post, archives), [])
+
+
 if __name__ == '__main__':
 	unittest.main()
@@ -144,5 +144,46 @@ class TestPageScraper(unittest.TestCase):
 		self.assertEqual(len(ad.images), 0)
 
 
+class TestFullSizeImages(unittest.TestCase):
+	"""
+	Full size image urls are built from the image ids found in the page.
+	"""
+	def setUp(self):
+		self.data_dir = Path(__file__).parent / 'test_data'
+
+	def _read_test_file(self, fp):
+		with open(fp, 'r') as f:
+			return f.read()
+
+	def test_ScrapePage_GivenFullSize_ScrapesFullSizeImages(self):
+		source = self._read_test_file(self.data_dir / 'cl-html-multiple-images.html')
+		ad = craigslist.scrape_page(source, full_size=True)
+		self.assertEqual(len(ad.images), 5)
+		for image in ad.images:
+			self.assertIn('_1200x900.jpg', image)
+
+	def test_ScrapePage_GivenFullSize_KeepsPageOrder(self):
+		source = self._read_test_file(self.data_dir / 'cl-html-multiple-images.html')
+		ad = craigslist.scrape_page(source, full_size=True)
+		self.assertEqual(ad.images[0], 'https://images.craigslist.org/00303_hvg2dCTqGMm_1200x900.jpg')
+
+	def test_ScrapePage_GivenFullSizeAndSingleImage_ScrapesImage(self):
+		source = self._read_test_file(self.data_dir / 'cl-html-single-image.html')
+		ad = craigslist.scrape_page(source, full_size=True)
+		self.assertEqual(ad.images, ['https://images.craigslist.org/00D0D_7D4lkcjOLSB_1200x900.jpg'])
+
+	def test_ScrapePage_GivenFullSizeAndNoImageList_UsesThumbnails(self):
+		source = self._read_test_file(self.data_dir / 'cl-html-multiple-images.html')
+		source = source.replace('imgList', 'notTheImageList')
+		ad = craigslist.scrape_page(source, full_size=True)
+		self.assertEqual(len(ad.images), 5)
+		self.assertIn('https://images.craigslist.org/00303_hvg2dCTqGMm_1200x900.jpg', ad.images)
+
+	def test_ScrapePage_GivenFullSizeAndNoImages_ReturnsNoImages(self):
+		source = self._read_test_file(self.data_dir / 'cl-html-no-images.html')
+		ad = craigslist.scrape_page(source, full_size=True)
+		self.assertEqual(len(ad.images), 0)
+
+
 if __name__ == '__main__':
 	unittest.main()
@@ -0,0 +1,125 @@
+"""
+Integration testing of the archive export. Each test exports from its own
+sqlite file in a temporary folder.
+"""
+import gzip
+import json
+import unittest
+import logging
+import tempfile
+import importlib.util
+from pathlib import Path
+
+from archivebot.sharding import Shard
+from archivebot.export import export, iter_chunks, main
+
+
+# disable application logging during tests
+logging.disable(logging.CRITICAL)
+
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+
+class TestExport(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+		self.dir = Path(self.tmp.name)
+		self.shard = Shard(str(self.dir / 'archive.db'))
+		self.shard.create_tables()
+
+	def tearDown(self):
+		self.shard.close()
+		self.tmp.cleanup()
+
+	def _save(self, count):
+		for i in range(count):
+			ad = self.shard.CraigslistAd(
+				title='Post title', post_id='64516611{:02d}'.format(i), body='Post description',
+				url='https://indianapolis.craigslist.org/bar/d/bears/64516611{:02d}.html'.format(i),
+				images=['https://images.craigslist.org/00000_abcd_600x450.jpg'],
+				)
+			ad.save()
+			self.shard.Archive(
+				url='https://imgur.com/a/zzzz{}'.format(i), title='xxx', ad=ad,
+				screenshot='https://i.imgur.com/abcd000.jpg',
+				images=['https://i.imgur.com/abcd001.jpg', 'https://i.imgur.com/abcd002.jpg'],
+				).save()
+
+	def _read(self, pth):
+		with gzip.open(str(pth), 'rt') as f:
+			return [json.loads(line) for line in f]
+
+	def test_IterChunks_GivenChunkSize_ReturnsChunksInIdOrder(self):
+		self._save(5)
+		chunks = list(iter_chunks(chunk_size=2, models=self.shard))
+		self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+		ids = [row['id'] for chunk in chunks for row in chunk]
+		self.assertEqual(ids, sorted(ids))
+
+	def test_Export_GivenArchives_WritesOneJsonLinePerArchive(self):
+		self._save(3)
+		pth = self.dir / 'export.jsonl.gz'
+		rows, last_id = export(str(pth), chunk_size=2, models=self.shard)
+		self.assertEqual(rows, 3)
+		lines = self._read(pth)
+		self.assertEqual(len(lines), 3)
+		self.assertEqual(lines[-1]['id'], last_id)
+
+	def test_Export_GivenArchive_IncludesAdAndImageLists(self):
+		self._save(1)
+		pth = self.dir / 'export.jsonl.gz'
+		export(str(pth), models=self.shard)
+		row = self._read(pth)[0]
+		self.assertEqual(row['post_id'], '6451661100')
+		self.assertEqual(row['ad_title'], 'Post title')
+		self.assertEqual(row['images'], ['https://i.imgur.com/abcd001.jpg', 'https://i.imgur.com/abcd002.jpg'])
+		self.assertEqual(row['ad_images'], ['https://images.craigslist.org/00000_abcd_600x450.jpg'])
+
+	def test_Export_GivenSinceId_OnlyWritesNewerArchives(self):
+		self._save(2)
+		_, last_id = export(str(self.dir / 'first.jsonl.gz'), models=self.shard)
+		self._save(1)
+		pth = self.dir / 'second.jsonl.gz'
+		rows, _ = export(str(pth), since_id=last_id, models=self.shard)
+		self.assertEqual(rows, 1)
+		self.assertGreater(self._read(pth)[0]['id'], last_id)
+
+	def test_Export_WithNothingNew_WritesNoFile(self):
+		self._save(2)
+		_, last_id = export(str(self.dir / 'first.jsonl.gz'), models=self.shard)
+		pth = self.dir / 'second.jsonl.gz'
+		self.assertEqual(export(str(pth), since_id=last_id, models=self.shard), (0, last_id))
+		self.assertFalse(pth.exists())
+
+	def test_Export_GivenUnknownFormat_RaisesValueError(self):
+		with self.assertRaises(ValueError):
+			export(str(self.dir / 'export.csv'), fmt='csv', models=self.shard)
+
+	@unittest.skipUnless(HAS_PYARROW, 'pyarrow is not installed')
+	def test_Export_AsParquet_WritesEveryArchive(self):
+		import pyarrow.parquet
+		self._save(5)
+		pth = self.dir / 'export.parquet'
+		export(str(pth), fmt='parquet', chunk_size=2, models=self.shard)
+		table = pyarrow.parquet.read_table(str(pth))
+		self.assertEqual(table.num_rows, 5)
+		self.assertEqual(table.column('images').to_pylist()[0], ['https://i.imgur.com/abcd001.jpg', 'https://i.imgur.com/abcd002.jpg'])
+
+	def test_Main_WithWatermark_ExportsOnlyNewArchives(self):
+		self._save(2)
+		self.shard.close()
+		db = str(self.dir / 'archive.db')
+		watermark = self.dir / 'export.watermark'
+		main([db, str(self.dir / 'first.jsonl.gz'), '--watermark', str(watermark)])
+		first_id = int(watermark.read_text())
+		self._save(1)
+		self.shard.close()
+		main([db, str(self.dir / 'second.jsonl.gz'), '--watermark', str(watermark)])
+		lines = self._read(self.dir / 'second.jsonl.gz')
+		self.assertEqual(len(lines), 1)
+		self.assertEqual(int(watermark.read_text()), lines[0]['id'])
+		self.assertGreater(lines[0]['id'], first_id)
+
+
+if __name__ == '__main__':
+	unittest.main()
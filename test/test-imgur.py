@@ -0,0 +1,159 @@
+import unittest
+import logging
+import tempfile
+from pathlib import Path
+
+import requests
+
+from archivebot.custommodels import DATABASE, Archive, CraigslistAd, ImageUpload
+from archivebot.errors import ImgurUploadError, RateLimitError
+from archivebot.fakeimgur import FakeImgur
+from archivebot.imgur import ImgurUploader, RateLimit
+
+
+# disable application logging during tests
+logging.disable(logging.CRITICAL)
+
+
+class FlakySession(requests.Session):
+	"""A session whose first upload of `name` fails with a connection error"""
+	def __init__(self, name):
+		super(FlakySession, self).__init__()
+		self.name = name
+
+	def post(self, url, files=None, **kwargs):
+		if files and Path(files['image'].name).name == self.name:
+			self.name = None
+			raise requests.ConnectionError('Connection reset by peer')
+		return super(FlakySession, self).post(url, files=files, **kwargs)
+
+
+class UploaderTest(unittest.TestCase):
+	"""
+	Base class which starts a fake Imgur server and creates images to upload.
+	"""
+	def setUp(self):
+		self.db = DATABASE
+		self.db.init(':memory:')
+		self.db.connect()
+		self.db.create_tables([Archive, CraigslistAd, ImageUpload], safe=True)
+
+		self.tmp = tempfile.TemporaryDirectory()
+		self.screenshot = self._make_image('screenshot.jpg')
+		self.images = [self._make_image('image{}.jpg'.format(i)) for i in range(3)]
+		self.ad = CraigslistAd(
+			title='Post title', post_id='1234567890', url='a_url', body='body_text')
+
+	def tearDown(self):
+		self.tmp.cleanup()
+		self.db.close()
+
+	def _make_image(self, name):
+		pth = Path(self.tmp.name) / name
+		pth.write_bytes(b'\xff\xd8' + name.encode())
+		return str(pth)
+
+	def _uploader(self, server):
+		return ImgurUploader('client-id', api_url=server.url, workers=2)
+
+
+class TestUploader(UploaderTest):
+	def test_Upload_GivenImages_CreatesAlbumWithScreenshotFirst(self):
+		with FakeImgur() as server:
+			self._uploader(server).upload(self.ad, self.screenshot, self.images)
+		album = list(server.albums.values())[0]
+		names = [server.images[image_id]['name'] for image_id in album['images']]
+		self.assertEqual(names, ['screenshot.jpg', 'image0.jpg', 'image1.jpg', 'image2.jpg'])
+
+	def test_Upload_GivenImages_ReturnsArchive(self):
+		with FakeImgur() as server:
+			archive = self._uploader(server).upload(self.ad, self.screenshot, self.images)
+		album_id = list(server.albums)[0]
+		self.assertEqual(archive.url, 'https://imgur.com/a/{}'.format(album_id))
+		self.assertEqual(archive.title, 'reddit-cl-bot archive 1234567890')
+		self.assertEqual(len(archive.images), 3)
+		self.assertNotIn(archive.screenshot, archive.images)
+
+	def test_Upload_GivenFailedImage_RaisesError(self):
+		with FakeImgur(failures=1) as server:
+			with self.assertRaises(ImgurUploadError):
+				self._uploader(server).upload(self.ad, self.screenshot, self.images)
+		self.assertEqual(len(server.albums), 0)
+
+	def test_Upload_AfterFailedImage_ResumesWithoutUploadingTwice(self):
+		with FakeImgur(failures=1) as server:
+			uploader = self._uploader(server)
+			with self.assertRaises(ImgurUploadError):
+				uploader.upload(self.ad, self.screenshot, self.images)
+			uploader.upload(self.ad, self.screenshot, self.images)
+		self.assertEqual(len(server.images), 4)
+		self.assertEqual(len(list(server.albums.values())[0]['images']), 4)
+
+	def test_Upload_AfterFailureWithNewScreenshotPath_ResumesWithoutUploadingTwice(self):
+		with FakeImgur(failures=1) as server:
+			uploader = self._uploader(server)
+			with self.assertRaises(ImgurUploadError):
+				uploader.upload(self.ad, self.screenshot, self.images)
+			screenshot = self._make_image('screenshot-retry.jpg')
+			archive = uploader.upload(self.ad, screenshot, self.images)
+		self.assertEqual(len(server.images), 4)
+		self.assertEqual(len(archive.images), 3)
+
+	def test_Upload_WhenUserLimitReached_RaisesRateLimitError(self):
+		with FakeImgur(user_limit=30) as server:
+			with self.assertRaises(RateLimitError):
+				self._uploader(server).upload(self.ad, self.screenshot, self.images)
+
+	def test_Upload_WhenUserLimitReachedWithUploadsQueued_RaisesRateLimitError(self):
+		images = [self._make_image('image{}.jpg'.format(i)) for i in range(8)]
+		with FakeImgur(user_limit=30, latency=0.05) as server:
+			with self.assertRaises(RateLimitError):
+				self._uploader(server).upload(self.ad, self.screenshot, images)
+
+	def test_Upload_GivenConnectionError_RaisesImgurUploadError(self):
+		with FakeImgur() as server:
+			uploader = ImgurUploader('client-id', api_url=server.url, workers=2, session=FlakySession('image1.jpg'))
+			with self.assertRaises(ImgurUploadError):
+				uploader.upload(self.ad, self.screenshot, self.images)
+		self.assertEqual(ImageUpload.select().count(), 3)
+
+	def test_Upload_AfterConnectionError_ResumesWithoutUploadingTwice(self):
+		with FakeImgur() as server:
+			uploader = ImgurUploader('client-id', api_url=server.url, workers=2, session=FlakySession('image1.jpg'))
+			with self.assertRaises(ImgurUploadError):
+				uploader.upload(self.ad, self.screenshot, self.images)
+			uploader.upload(self.ad, self.screenshot, self.images)
+		self.assertEqual(len(server.images), 4)
+
+	def test_Upload_WhenUserLimitReached_StopsMakingRequests(self):
+		with FakeImgur(user_limit=50) as server:
+			uploader = self._uploader(server)
+			uploader.upload(self.ad, self.screenshot, self.images)
+			requests_made = server.requests
+			with self.assertRaises(RateLimitError):
+				uploader.upload(self.ad, self.screenshot, self.images[:1])
+		self.assertEqual(server.requests, requests_made)
+
+
+class TestRateLimit(unittest.TestCase):
+	def test_RateLimit_GivenHeaders_TracksRemainingCredits(self):
+		rate_limit = RateLimit()
+		rate_limit.update({
+			'X-RateLimit-ClientRemaining': '12000',
+			'X-RateLimit-UserRemaining': '500',
+			})
+		self.assertEqual(rate_limit.client_remaining, 12000)
+		self.assertEqual(rate_limit.user_remaining, 500)
+
+	def test_RateLimit_BeforeAnyResponse_AllowsRequests(self):
+		RateLimit().check()
+
+	def test_RateLimit_WithNoClientCreditsLeft_RaisesError(self):
+		rate_limit = RateLimit()
+		rate_limit.update({'X-RateLimit-ClientRemaining': '0'})
+		with self.assertRaises(RateLimitError):
+			rate_limit.check()
+
+
+if __name__ == '__main__':
+	unittest.main()
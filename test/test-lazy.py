@@ -0,0 +1,68 @@
+import os
+import sys
+import unittest
+import subprocess
+import tempfile
+from pathlib import Path
+
+from archivebot.lazy import lazy_import, load
+
+
+class TestLazyImport(unittest.TestCase):
+	def setUp(self):
+		# A throwaway module that records when it is actually executed.
+		self.tmp = tempfile.TemporaryDirectory()
+		module = Path(self.tmp.name) / 'lazy_probe.py'
+		module.write_text('import os\nos.environ["LAZY_PROBE"] = "loaded"\nvalue = 1\n')
+		sys.path.insert(0, self.tmp.name)
+		os.environ.pop('LAZY_PROBE', None)
+
+	def tearDown(self):
+		sys.path.remove(self.tmp.name)
+		sys.modules.pop('lazy_probe', None)
+		os.environ.pop('LAZY_PROBE', None)
+		self.tmp.cleanup()
+
+	def test_LazyImport_BeforeUse_DoesNotLoadModule(self):
+		lazy_import('lazy_probe')
+		self.assertNotIn('LAZY_PROBE', os.environ)
+
+	def test_LazyImport_OnFirstUse_LoadsModule(self):
+		module = lazy_import('lazy_probe')
+		self.assertEqual(module.value, 1)
+		self.assertEqual(os.environ['LAZY_PROBE'], 'loaded')
+
+	def test_Load_GivenLazyModule_LoadsModule(self):
+		load(lazy_import('lazy_probe'))
+		self.assertEqual(os.environ['LAZY_PROBE'], 'loaded')
+
+	def test_LazyImport_GivenLoadedModule_ReturnsModule(self):
+		self.assertIs(lazy_import('unittest'), unittest)
+
+	def test_LazyImport_GivenMissingModule_RaisesError(self):
+		with self.assertRaises(ImportError):
+			lazy_import('no_such_module_anywhere')
+
+
+class TestStartup(unittest.TestCase):
+	"""
+	Importing the bot should not load any of the heavy dependencies.
+	"""
+	def _loaded_after_import(self, module, dependency):
+		code = 'import sys, {}; print({!r} in sys.modules)'.format(module, dependency)
+		out = subprocess.check_output(
+			[sys.executable, '-c', code], cwd=Path(__file__).parent.parent, text=True)
+		return out.strip() == 'True'
+
+	def test_ImportBot_DoesNotLoadRequests(self):
+		self.assertFalse(self._loaded_after_import('archivebot.bot', 'requests.sessions'))
+
+	def test_ImportCraigslist_DoesNotLoadBeautifulSoup(self):
+		self.assertFalse(self._loaded_after_import('archivebot.craigslist', 'bs4.element'))
+
+	def test_ImportCraigslist_DoesNotLoadHtml2text(self):
+		self.assertFalse(self._loaded_after_import('archivebot.craigslist', 'html2text.config'))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+import logging
+
+from archivebot.memory import (
+	ByteBoundedCache, MemoryGovernor, RECYCLE_EXIT_CODE, estimate_size, object_counts, rss_bytes
+	)
+
+
+# disable application logging during tests
+logging.disable(logging.CRITICAL)
+
+
+class Tag(object):
+	"""Stands in for a tracked type"""
+
+
+class TestByteBoundedCache(unittest.TestCase):
+	def test_Set_PastMaxBytes_EvictsOldestFirst(self):
+		cache = ByteBoundedCache(max_bytes=25, sizeof=len)
+		cache['a'] = 'x' * 9
+		cache['b'] = 'x' * 9
+		cache['c'] = 'x' * 9
+		self.assertEqual(list(cache), ['b', 'c'])
+		self.assertEqual(cache.bytes, 20)
+
+	def test_Get_GivenKey_MakesItNewest(self):
+		cache = ByteBoundedCache(max_bytes=25, sizeof=len)
+		cache['a'] = 'x' * 9
+		cache['b'] = 'x' * 9
+		cache.get('a')
+		cache['c'] = 'x' * 9
+		self.assertEqual(list(cache), ['a', 'c'])
+
+	def test_Set_PastMaxEntries_EvictsOldest(self):
+		cache = ByteBoundedCache(max_bytes=1000, max_entries=2, sizeof=len)
+		for key in 'abc':
+			cache[key] = 'x'
+		self.assertEqual(list(cache), ['b', 'c'])
+
+	def test_Set_GivenExistingKey_ReplacesSize(self):
+		cache = ByteBoundedCache(max_bytes=1000, sizeof=len)
+		cache['a'] = 'x' * 10
+		cache['a'] = 'x'
+		self.assertEqual(cache.bytes, 2)
+		self.assertEqual(len(cache), 1)
+
+	def test_Delete_GivenKey_FreesItsBytes(self):
+		cache = ByteBoundedCache(max_bytes=1000, sizeof=len)
+		cache['a'] = 'x' * 10
+		del cache['a']
+		self.assertEqual(cache.bytes, 0)
+		self.assertNotIn('a', cache)
+
+	def test_EstimateSize_GivenNestedContainer_CountsContents(self):
+		text = 'x' * 1000
+		self.assertGreater(estimate_size({'body': [text]}), len(text))
+
+
+class TestMemoryGovernor(unittest.TestCase):
+	def setUp(self):
+		self.rss = 100 * 1024 * 1024
+
+	def _governor(self, **kwargs):
+		return MemoryGovernor(ceiling_mb=200, rss=lambda: self.rss, **kwargs)
+
+	def test_RssBytes_ReturnsPositiveSize(self):
+		self.assertGreater(rss_bytes(), 0)
+
+	def test_Check_UnderCeiling_DoesNothing(self):
+		governor = self._governor()
+		governor.check()
+		self.assertFalse(governor.should_recycle())
+
+	def test_Check_OverCeiling_ExitsWithRecycleCode(self):
+		governor = self._governor()
+		self.rss = 300 * 1024 * 1024
+		with self.assertRaises(SystemExit) as raised:
+			governor.check()
+		self.assertEqual(raised.exception.code, RECYCLE_EXIT_CODE)
+
+	def test_Stage_GivenGrowth_RecordsRssPerStage(self):
+		governor = self._governor(count_every=0)
+		with governor.stage('scrape_page'):
+			self.rss += 2048
+		self.assertEqual(governor.stages['scrape_page']['rss'], 2048)
+		self.assertEqual(governor.summary(), {'scrape_page': 2.0})
+
+	def test_Stage_WhenCounting_RecordsTrackedObjectGrowth(self):
+		governor = self._governor(count_every=1)
+		with governor.stage('scrape_page'):
+			tags = [Tag() for _ in range(10)]
+		self.assertEqual(governor.stages['scrape_page']['Tag'], 10)
+		del tags
+
+	def test_ObjectCounts_GivenTypes_CountsLiveObjects(self):
+		tags = [Tag() for _ in range(3)]
+		self.assertGreaterEqual(object_counts(('Tag',))['Tag'], 3)
+		del tags
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 
-from archivebot.custommodels import Archive, CraigslistAd, AdCache
+from archivebot.custommodels import Archive, CraigslistAd, AdCache, trusted_load
 from archivebot.errors import InvalidImagePathException
 
 
@@ -58,6 +58,34 @@ class TestCraigslistAd(unittest.TestCase):
 		ad = AdCache(title='', post_id='', url='', body='')
 		ad.images = self.local_images
 
+	def test_ValidateMany_GivenValidImages_DoesNotRaise(self):
+		CraigslistAd.validate_many(self.remote_images)
+		AdCache.validate_many(self.local_images)
+
+	def test_ValidateMany_GivenOneInvalidImage_RaisesError(self):
+		with self.assertRaises(InvalidImagePathException):
+			CraigslistAd.validate_many(self.remote_images + self.local_images[:1])
+
+	def test_ValidateMany_GivenSubclasses_UsesEachSubclassPattern(self):
+		CraigslistAd.validate_many(self.remote_images)
+		with self.assertRaises(InvalidImagePathException):
+			AdCache.validate_many(self.remote_images)
+
+	def test_CraigslistAd_InTrustedLoad_SkipsValidation(self):
+		with trusted_load():
+			ad = CraigslistAd(
+				title='', post_id='', url='',
+				body='', images=self.local_images)
+		self.assertEqual(ad.images, self.local_images)
+
+	def test_CraigslistAd_AfterTrustedLoad_ValidatesAgain(self):
+		with trusted_load():
+			pass
+		with self.assertRaises(InvalidImagePathException):
+			CraigslistAd(
+				title='', post_id='', url='',
+				body='', images=self.local_images)
+
 
 if __name__ == '__main__':
 	unittest.main()
@@ -0,0 +1,117 @@
+"""
+Integration testing of the pre-forking runner. `serve` blocks and installs
+signal handlers, so each test runs it in its own python process, with
+workers that write their pid to a file when they start.
+"""
+import os
+import sys
+import time
+import signal
+import sqlite3
+import unittest
+import tempfile
+import subprocess
+from contextlib import closing
+from pathlib import Path
+
+from archivebot import prefork
+from archivebot.custommodels import DATABASE, MODELS
+
+
+ROOT = Path(__file__).resolve().parents[1]
+
+SCRIPT = '''
+import os, sys, time
+from archivebot import prefork
+
+def worker():
+	with open(sys.argv[1], 'a') as f:
+		f.write('{{}}\\n'.format(os.getpid()))
+	{body}
+
+prefork.serve(worker, workers=2, warm=False, restart_delay={restart_delay})
+'''
+
+
+class TestServe(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+		self.started = Path(self.tmp.name) / 'started.txt'
+		self.process = None
+
+	def tearDown(self):
+		if self.process is not None and self.process.poll() is None:
+			self.process.kill()
+			self.process.wait()
+		self.tmp.cleanup()
+
+	def _serve(self, body, restart_delay=0.1):
+		script = SCRIPT.format(body=body, restart_delay=restart_delay)
+		# Keep any existing path, which may be where the dependencies are.
+		path = [str(ROOT), os.environ.get('PYTHONPATH', '')]
+		env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, path)))
+		self.process = subprocess.Popen(
+			[sys.executable, '-c', script, str(self.started)], env=env,
+			stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+	def _pids(self):
+		try:
+			return [int(line) for line in self.started.read_text().split()]
+		except FileNotFoundError:
+			return []
+
+	def _wait_for_starts(self, count, timeout=10):
+		end = time.monotonic() + timeout
+		while time.monotonic() < end:
+			if len(self._pids()) >= count:
+				return
+			time.sleep(0.05)
+		self.fail('Only {} of {} workers started'.format(len(self._pids()), count))
+
+	def _stop(self):
+		self.process.send_signal(signal.SIGTERM)
+		return self.process.wait(timeout=10)
+
+	def _alive(self, pid):
+		try:
+			os.kill(pid, 0)
+		except ProcessLookupError:
+			return False
+		return True
+
+	def test_Serve_WhenWorkerExits_RestartsIt(self):
+		self._serve('time.sleep(0.2)')
+		self._wait_for_starts(6)
+		self._stop()
+		self.assertEqual(len(set(self._pids())), len(self._pids()))
+
+	def test_Serve_GivenSigterm_StopsEveryWorker(self):
+		self._serve('time.sleep(60)')
+		self._wait_for_starts(2)
+		self.assertEqual(self._stop(), 0)
+		self.assertFalse(any(self._alive(pid) for pid in self._pids()))
+
+	def test_Serve_WhenWorkerCrashesOnStartup_WaitsBeforeRestarting(self):
+		self._serve('raise RuntimeError("crash")', restart_delay=0.5)
+		self._wait_for_starts(2)
+		time.sleep(1)
+		self._stop()
+		# Without the delay, workers would be restarted hundreds of times.
+		self.assertLessEqual(len(self._pids()), 8)
+
+
+class TestWarmUp(unittest.TestCase):
+	def test_WarmUp_GivenDatabase_CreatesEveryTable(self):
+		with tempfile.TemporaryDirectory() as tmp:
+			pth = str(Path(tmp) / 'archive.db')
+			prefork.warm_up(pth)
+			with closing(sqlite3.connect(pth)) as conn:
+				rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+				tables = {name for name, in rows}
+		DATABASE.init(None)
+		for model in MODELS:
+			self.assertIn(model._meta.db_table, tables)
+
+
+if __name__ == '__main__':
+	unittest.main()
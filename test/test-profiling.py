@@ -0,0 +1,124 @@
+import json
+import time
+import unittest
+import logging
+import tempfile
+from pathlib import Path
+
+from archivebot.profiling import JobProfiler, NullProfiler, hottest_frame, report
+
+
+# disable application logging during tests
+logging.disable(logging.CRITICAL)
+
+
+def spin(seconds):
+	end = time.perf_counter() + seconds
+	while time.perf_counter() < end:
+		pass
+
+
+class TestJobProfiler(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+		self.dump_dir = Path(self.tmp.name)
+
+	def tearDown(self):
+		self.tmp.cleanup()
+
+	def _saved_jobs(self):
+		return [json.loads(pth.read_text()) for pth in sorted(self.dump_dir.glob('*.json'))]
+
+	def test_Job_GivenStages_RecordsEachStageInOrder(self):
+		profiler = JobProfiler(self.dump_dir)
+		with profiler.job('ad') as job:
+			with job.stage('request_page'):
+				pass
+			with job.stage('scrape_page'):
+				pass
+		self.assertEqual([name for name, ms in job.stages], ['request_page', 'scrape_page'])
+
+	def test_Job_WhenFast_IsNotSaved(self):
+		profiler = JobProfiler(self.dump_dir, threshold_ms=10000)
+		with profiler.job('ad'):
+			pass
+		self.assertEqual(self._saved_jobs(), [])
+
+	def test_Job_WhenSlow_IsSavedWithAttachments(self):
+		profiler = JobProfiler(self.dump_dir, threshold_ms=0)
+		with profiler.job('ad') as job:
+			job.attach('html', '<html></html>')
+		saved = self._saved_jobs()
+		self.assertEqual(saved[0]['name'], 'ad')
+		self.assertEqual(len(list(self.dump_dir.glob('*.html'))), 1)
+
+	def test_Job_WhenSlow_SamplesHottestFunction(self):
+		profiler = JobProfiler(self.dump_dir, threshold_ms=50, sample_interval=0.002)
+		with profiler.job('ad'):
+			spin(0.2)
+		self.assertIn(' spin', self._saved_jobs()[0]['hottest'])
+
+	def test_Job_WithFullProfiling_SavesProfileStats(self):
+		profiler = JobProfiler(self.dump_dir, threshold_ms=0, full=True)
+		with profiler.job('ad'):
+			spin(0.01)
+		self.assertEqual(len(list(self.dump_dir.glob('*.prof'))), 1)
+
+	def test_Job_WhenStageRaises_StillRecordsStage(self):
+		profiler = JobProfiler(self.dump_dir)
+		with self.assertRaises(ValueError):
+			with profiler.job('ad') as job:
+				with job.stage('reply'):
+					raise ValueError
+		self.assertEqual(job.stages[0][0], 'reply')
+
+	def test_Job_WhenSavingFails_DoesNotRaise(self):
+		profiler = JobProfiler(self.dump_dir, threshold_ms=0)
+		with profiler.job('ad') as job:
+			job.attach('html', b'not text')
+
+	def test_Job_WhileSampling_KeepsSamplesOfFinishedJobsUnchanged(self):
+		profiler = JobProfiler(self.dump_dir, threshold_ms=10000, sample_interval=0.001)
+		with profiler.job('ad') as job:
+			spin(0.05)
+		samples = dict(job.samples)
+		with profiler.job('other'):
+			spin(0.05)
+		self.assertEqual(dict(job.samples), samples)
+
+	def test_NullProfiler_GivenJob_DoesNothing(self):
+		with NullProfiler().job('ad') as job:
+			with job.stage('reply'):
+				job.attach('html', '')
+
+
+class TestReport(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+		self.dump_dir = Path(self.tmp.name)
+
+	def tearDown(self):
+		self.tmp.cleanup()
+
+	def _save(self, name, hottest, duration_ms):
+		job = {'name': name, 'hottest': hottest, 'duration_ms': duration_ms}
+		(self.dump_dir / '{}.json'.format(name)).write_text(json.dumps(job))
+
+	def test_HottestFrame_GivenSamples_ReturnsMostCommonLeaf(self):
+		samples = {('main', 'parse'): 3, ('main', 'reply'): 1, ('other', 'parse'): 1}
+		self.assertEqual(hottest_frame(samples), 'parse')
+
+	def test_HottestFrame_GivenNoSamples_ReturnsNone(self):
+		self.assertIsNone(hottest_frame({}))
+
+	def test_Report_GivenSlowJobs_GroupsByHottestFrame(self):
+		self._save('a', 'parse', 100)
+		self._save('b', 'parse', 300)
+		self._save('c', 'reply', 200)
+		rows = report(self.dump_dir)
+		self.assertEqual(rows[0], ('parse', 2, 200, 300, 'b'))
+		self.assertEqual(rows[1][0], 'reply')
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,212 @@
+import time
+import unittest
+import logging
+from email.utils import formatdate
+from unittest.mock import Mock
+
+from archivebot.custommodels import DATABASE, OutboxReply
+from archivebot import scheduler
+
+
+# disable application logging during tests
+logging.disable(logging.CRITICAL)
+
+
+class Clock(object):
+	def __init__(self, now=1000):
+		self.now = now
+
+	def __call__(self):
+		return self.now
+
+
+class TestRateLimitParsing(unittest.TestCase):
+	def test_ParseMessage_GivenMinutes_ReturnsSeconds(self):
+		msg = 'you are doing that too much. try again in 9 minutes.'
+		self.assertEqual(scheduler.parse_ratelimit_message(msg), 540)
+
+	def test_ParseMessage_GivenSeconds_ReturnsSeconds(self):
+		msg = 'you are doing that too much. try again in 30 seconds.'
+		self.assertEqual(scheduler.parse_ratelimit_message(msg), 30)
+
+	def test_ParseMessage_GivenNoTime_ReturnsDefault(self):
+		self.assertEqual(
+			scheduler.parse_ratelimit_message('slow down'),
+			scheduler.DEFAULT_RATELIMIT_DELAY)
+
+	def test_ParseHeaders_GivenRemainingRequests_ReturnsNone(self):
+		headers = {'X-Ratelimit-Remaining': '12.0', 'X-Ratelimit-Reset': '300'}
+		self.assertIsNone(scheduler.parse_ratelimit_headers(headers))
+
+	def test_ParseHeaders_GivenNoRemainingRequests_ReturnsReset(self):
+		headers = {'X-Ratelimit-Remaining': '0', 'X-Ratelimit-Reset': '300'}
+		self.assertEqual(scheduler.parse_ratelimit_headers(headers), 300)
+
+	def test_ParseHeaders_GivenRetryAfterDate_ReturnsSecondsUntilDate(self):
+		headers = {'Retry-After': formatdate(time.time() + 120, usegmt=True)}
+		self.assertAlmostEqual(scheduler.parse_ratelimit_headers(headers), 120, delta=2)
+
+	def test_ParseHeaders_GivenInvalidRetryAfter_ReturnsDefault(self):
+		headers = {'Retry-After': 'soon'}
+		self.assertEqual(scheduler.parse_ratelimit_headers(headers), scheduler.DEFAULT_RATELIMIT_DELAY)
+
+	def test_RatelimitDelay_GivenPrawApiError_ReturnsDelay(self):
+		error = Exception()
+		error.error_type = 'RATELIMIT'
+		error.message = 'try again in 2 minutes.'
+		self.assertEqual(scheduler.ratelimit_delay(error), 120)
+
+	def test_RatelimitDelay_GivenTooManyRequests_ReturnsDelay(self):
+		error = Exception()
+		error.response = Mock(status_code=429, headers={'retry-after': '7'})
+		self.assertEqual(scheduler.ratelimit_delay(error), 7)
+
+	def test_RatelimitDelay_GivenOtherError_ReturnsNone(self):
+		self.assertIsNone(scheduler.ratelimit_delay(ValueError('nope')))
+
+
+class TestTokenBucket(unittest.TestCase):
+	def setUp(self):
+		self.clock = Clock()
+		self.bucket = scheduler.TokenBucket(rate=1, capacity=2, clock=self.clock)
+
+	def test_Take_WhenFull_AllowsBurstUpToCapacity(self):
+		self.assertTrue(self.bucket.take())
+		self.assertTrue(self.bucket.take())
+		self.assertFalse(self.bucket.take())
+
+	def test_Take_AfterWaiting_Refills(self):
+		self.bucket.take()
+		self.bucket.take()
+		self.clock.now += 1
+		self.assertTrue(self.bucket.take())
+
+	def test_Take_WhenPaused_ReturnsFalse(self):
+		self.bucket.pause(60)
+		self.clock.now += 30
+		self.assertFalse(self.bucket.take())
+
+	def test_Take_AfterPause_Refills(self):
+		self.bucket.pause(60)
+		self.clock.now += 61
+		self.assertTrue(self.bucket.take())
+
+	def test_WaitTime_WhenPaused_ReturnsRestOfPause(self):
+		self.bucket.pause(60)
+		self.clock.now += 20
+		self.assertEqual(self.bucket.wait_time(), 40)
+
+
+class StopAfter(object):
+	"""Stands in for threading.Event, recording waits and stopping after `count`"""
+	def __init__(self, count=1):
+		self.count = count
+		self.waits = []
+
+	def is_set(self):
+		return len(self.waits) >= self.count
+
+	def wait(self, timeout):
+		self.waits.append(timeout)
+
+
+class TestReplyScheduler(unittest.TestCase):
+	def setUp(self):
+		self.db = DATABASE
+		self.db.init(':memory:')
+		self.db.connect()
+		self.db.create_tables([OutboxReply], safe=True)
+
+		self.clock = Clock()
+		self.target = Mock()
+		self.target.reply.return_value = Mock(fullname='t1_reply')
+		self.resolve = Mock(return_value=self.target)
+		bucket = scheduler.TokenBucket(rate=1, capacity=100, clock=self.clock)
+		self.scheduler = scheduler.ReplyScheduler(
+			self.resolve, bucket=bucket, max_attempts=2, backoff=10, clock=self.clock)
+
+	def tearDown(self):
+		self.db.close()
+
+	def _enqueue(self, fullname, created):
+		post = Mock(fullname=fullname, thread_id=fullname[3:], thread_created=created)
+		return self.scheduler.enqueue(post, 'reply body')
+
+	def test_Enqueue_GivenPost_SavesPendingReply(self):
+		self._enqueue('t3_abc', 100)
+		self.assertEqual(OutboxReply.select().where(OutboxReply.status == 'pending').count(), 1)
+
+	def test_SendPending_GivenReplies_SendsNewestThreadFirst(self):
+		self._enqueue('t3_old', 100)
+		self._enqueue('t3_new', 200)
+		self.scheduler.send_pending()
+		fullnames = [call[0][0] for call in self.resolve.call_args_list]
+		self.assertEqual(fullnames, ['t3_new', 't3_old'])
+
+	def test_SendPending_WhenSent_MarksReplySent(self):
+		reply = self._enqueue('t3_abc', 100)
+		self.scheduler.send_pending()
+		reply = OutboxReply.get(OutboxReply.id == reply.id)
+		self.assertEqual(reply.status, 'sent')
+		self.assertEqual(reply.reply_id, 't1_reply')
+
+	def test_SendPending_WhenRateLimited_KeepsReplyPendingWithoutAttempt(self):
+		error = Exception()
+		error.error_type = 'RATELIMIT'
+		error.message = 'try again in 5 minutes.'
+		self.target.reply.side_effect = error
+		reply = self._enqueue('t3_abc', 100)
+		self.assertEqual(self.scheduler.send_pending(), 0)
+		reply = OutboxReply.get(OutboxReply.id == reply.id)
+		self.assertEqual(reply.status, 'pending')
+		self.assertEqual(reply.attempts, 0)
+		self.assertEqual(self.scheduler.bucket.wait_time(), 300)
+
+	def test_SendPending_WhenFailed_RetriesAfterBackoff(self):
+		self.target.reply.side_effect = [ValueError('boom'), Mock(fullname='t1_reply')]
+		self._enqueue('t3_abc', 100)
+		self.scheduler.send_pending()
+		self.assertEqual(self.scheduler.send_pending(), 0)
+		self.clock.now += 10
+		self.assertEqual(self.scheduler.send_pending(), 1)
+
+	def test_SendPending_WhenFailedTooOften_MovesToDeadLetters(self):
+		self.target.reply.side_effect = ValueError('boom')
+		self._enqueue('t3_abc', 100)
+		self.scheduler.send_pending()
+		self.clock.now += 10
+		self.scheduler.send_pending()
+		self.assertEqual(self.scheduler.dead_letters().count(), 1)
+
+	def test_Requeue_GivenDeadReply_SendsAgain(self):
+		self.target.reply.side_effect = ValueError('boom')
+		self._enqueue('t3_abc', 100)
+		self.scheduler.send_pending()
+		self.clock.now += 10
+		self.scheduler.send_pending()
+		self.target.reply.side_effect = None
+		self.scheduler.requeue(self.scheduler.dead_letters().get())
+		self.assertEqual(self.scheduler.send_pending(), 1)
+
+	def test_Run_WithEmptyOutbox_SleepsIdle(self):
+		stop = StopAfter()
+		self.scheduler.run(stop, idle=30)
+		self.assertEqual(stop.waits, [30])
+
+	def test_Run_WithReplyNotYetDue_SleepsUntilItIsDue(self):
+		self.target.reply.side_effect = ValueError('boom')
+		self._enqueue('t3_abc', 100)
+		stop = StopAfter()
+		self.scheduler.run(stop, idle=30)
+		self.assertEqual(stop.waits, [10])
+
+	def test_Run_WithReplyDueButBucketPaused_SleepsUntilBucketRefills(self):
+		self._enqueue('t3_abc', 100)
+		self.scheduler.bucket.pause(3)
+		stop = StopAfter()
+		self.scheduler.run(stop, idle=30)
+		self.assertEqual(stop.waits, [3])
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,151 @@
+"""
+Integration testing of the sharded databases. Each test gets its own set of
+sqlite files in a temporary folder.
+"""
+import unittest
+import tempfile
+from pathlib import Path
+
+from archivebot.custommodels import Archive, CraigslistAd
+from archivebot.sharding import ShardRouter, rebalance, region_from_url
+
+
+class ShardTest(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+		self.routers = []
+
+	def tearDown(self):
+		for router in self.routers:
+			router.close()
+		self.tmp.cleanup()
+
+	def _router(self, shards, prefix='shard', **kwargs):
+		paths = [str(Path(self.tmp.name) / '{}{}.db'.format(prefix, i)) for i in range(shards)]
+		router = ShardRouter(paths, **kwargs)
+		router.create_tables()
+		self.routers.append(router)
+		return router
+
+	def _archive(self, post_id, region='indianapolis'):
+		ad = CraigslistAd(
+			title='Post title', post_id=post_id, body='Post description',
+			url='https://{}.craigslist.org/bar/d/bears/{}.html'.format(region, post_id),
+			)
+		return Archive(
+			url='https://imgur.com/a/zzzz1', title='xxx', ad=ad,
+			screenshot='https://i.imgur.com/abcd000.jpg',
+			images=['https://i.imgur.com/abcd001.jpg'])
+
+	def _count(self, shard):
+		return shard.CraigslistAd.select().count()
+
+
+class TestShardRouter(ShardTest):
+	def test_RegionFromUrl_GivenAdUrl_ReturnsSubdomain(self):
+		url = 'https://indianapolis.craigslist.org/bar/d/bears/6451661128.html'
+		self.assertEqual(region_from_url(url), 'indianapolis')
+
+	def test_ShardFor_GivenSamePostId_AlwaysReturnsSameShard(self):
+		router = self._router(4)
+		self.assertIs(router.shard_for('6451661128'), router.shard_for('6451661128'))
+
+	def test_Save_GivenArchives_SpreadsAdsOverShards(self):
+		router = self._router(4)
+		for i in range(40):
+			router.save(self._archive('64516611{:02d}'.format(i)))
+		counts = [self._count(shard) for shard in router.shards]
+		self.assertEqual(sum(counts), 40)
+		self.assertTrue(all(counts))
+
+	def test_GetArchive_AfterSave_ReturnsArchiveWithAd(self):
+		router = self._router(3)
+		router.save(self._archive('6451661128'))
+		archive = router.get_archive('6451661128')
+		self.assertEqual(archive.url, 'https://imgur.com/a/zzzz1')
+		self.assertEqual(archive.ad.post_id, '6451661128')
+		self.assertEqual(archive.images, ['https://i.imgur.com/abcd001.jpg'])
+
+	def test_Save_SameArchiveTwice_UpdatesInsteadOfAdding(self):
+		router = self._router(3)
+		archive = self._archive('6451661128')
+		router.save(archive.ad)
+		router.save(archive)
+		archive.title = 'yyy'
+		router.save(archive)
+		shard = router.shard_for('6451661128')
+		self.assertEqual(self._count(shard), 1)
+		self.assertEqual(shard.Archive.select().count(), 1)
+		self.assertEqual(router.get_archive('6451661128').title, 'yyy')
+
+	def test_GetAd_GivenUnknownPostId_RaisesDoesNotExist(self):
+		router = self._router(3)
+		with self.assertRaises(CraigslistAd.DoesNotExist):
+			router.get_ad('1234567890')
+
+	def test_Save_ByRegion_KeepsRegionTogether(self):
+		router = self._router(3, by='region')
+		for i in range(10):
+			router.save(self._archive('64516611{:02d}'.format(i), region='dallas'))
+		counts = sorted(self._count(shard) for shard in router.shards)
+		self.assertEqual(counts, [0, 0, 10])
+
+	def test_Save_ByRegionWithPinnedRegion_UsesPinnedShard(self):
+		router = self._router(3, by='region', regions={'dallas': 2})
+		router.save(self._archive('6451661128', region='dallas'))
+		self.assertEqual(self._count(router.shards[2]), 1)
+
+	def test_GetAd_ByRegionWithoutUrl_ChecksEveryShard(self):
+		router = self._router(3, by='region')
+		router.save(self._archive('6451661128', region='dallas'))
+		self.assertEqual(router.get_ad('6451661128').post_id, '6451661128')
+
+	def test_FanOut_GivenQuery_ReturnsResultsFromEveryShard(self):
+		router = self._router(3)
+		for i in range(10):
+			router.save(self._archive('64516611{:02d}'.format(i)))
+		archives = list(router.fan_out(lambda shard: shard.Archive.select()))
+		self.assertEqual(len(archives), 10)
+
+
+class TestRebalance(ShardTest):
+	def test_Rebalance_ToMoreShards_KeepsEveryAd(self):
+		source = self._router(2)
+		for i in range(20):
+			source.save(self._archive('64516611{:02d}'.format(i)))
+		target = self._router(3)
+		rebalance(source, target)
+		counts = [self._count(shard) for shard in target.shards]
+		self.assertEqual(sum(counts), 20)
+		self.assertTrue(all(counts))
+
+	def test_Rebalance_ToMoreShards_CanFindEveryArchive(self):
+		source = self._router(2)
+		for i in range(20):
+			source.save(self._archive('64516611{:02d}'.format(i)))
+		target = self._router(3)
+		rebalance(source, target)
+		for i in range(20):
+			archive = target.get_archive('64516611{:02d}'.format(i))
+			self.assertEqual(archive.title, 'xxx')
+
+	def test_Rebalance_AfterCrashBeforeDelete_LeavesNoDuplicates(self):
+		source = self._router(1)
+		source.save(self._archive('6451661128'))
+		target = self._router(2, prefix='target')
+		# The copy went through, but the original was never deleted.
+		target.save(self._archive('6451661128'))
+		rebalance(source, target)
+		self.assertEqual(sum(self._count(shard) for shard in target.shards), 1)
+		self.assertEqual(sum(shard.Archive.select().count() for shard in target.shards), 1)
+		self.assertEqual(self._count(source.shards[0]), 0)
+
+	def test_Rebalance_WithSameShards_MovesNothing(self):
+		source = self._router(2)
+		for i in range(5):
+			source.save(self._archive('64516611{:02d}'.format(i)))
+		self.assertEqual(rebalance(source, self._router(2)), 0)
+
+
+if __name__ == '__main__':
+	unittest.main()
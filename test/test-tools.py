@@ -0,0 +1,148 @@
+import unittest
+import logging
+import tempfile
+import threading
+from pathlib import Path
+
+from archivebot.tools import Camera, StubRenderer
+from archivebot.errors import SnapshotTimeoutError
+
+
+# disable application logging during tests
+logging.disable(logging.CRITICAL)
+
+
+class CrashedRenderer(StubRenderer):
+	def new_page(self):
+		raise RuntimeError('browser crashed')
+
+
+class TestCamera(unittest.TestCase):
+	def setUp(self):
+		self.tmp = tempfile.TemporaryDirectory()
+		self.url = 'https://indianapolis.craigslist.org/bar/d/bears/6451661128.html'
+		self.renderers = []
+
+	def tearDown(self):
+		self.tmp.cleanup()
+
+	def _factory(self, delay=0):
+		def factory():
+			renderer = StubRenderer(delay=delay)
+			self.renderers.append(renderer)
+			return renderer
+		return factory
+
+	def _camera(self, **kwargs):
+		return Camera(self._factory(kwargs.pop('delay', 0)), tmp_dir=self.tmp.name, **kwargs)
+
+	def test_Camera_WhenCreated_StartsAllRenderers(self):
+		self._camera(instances=3)
+		self.assertEqual(len(self.renderers), 3)
+
+	def test_TakeSnapshot_GivenUrl_SavesSnapshot(self):
+		with self._camera() as camera:
+			pth = camera.take_snapshot(self.url)
+		self.assertTrue(Path(pth).exists())
+
+	def test_TakeSnapshot_GivenDestination_SavesToDestination(self):
+		dest = str(Path(self.tmp.name) / 'shot.png')
+		with self._camera() as camera:
+			self.assertEqual(camera.take_snapshot(self.url, dest=dest), dest)
+
+	def test_TakeSnapshot_GivenUrl_LoadsUrl(self):
+		with self._camera(instances=1) as camera:
+			camera.take_snapshot(self.url)
+		self.assertEqual(self.renderers[0].loaded, [('url', self.url)])
+
+	def test_TakeSnapshot_GivenHtml_RendersHtmlInsteadOfLoadingUrl(self):
+		with self._camera(instances=1) as camera:
+			camera.take_snapshot(self.url, html='<html></html>')
+		self.assertEqual(self.renderers[0].loaded, [('html', self.url)])
+
+	def test_TakeSnapshot_MultipleJobs_ReusesRenderers(self):
+		with self._camera(instances=1) as camera:
+			for _ in range(5):
+				camera.take_snapshot(self.url)
+		self.assertEqual(len(self.renderers), 1)
+		self.assertEqual(self.renderers[0].pages_opened, 5)
+
+	def test_TakeSnapshot_AfterMaxJobs_RecyclesRenderer(self):
+		with self._camera(instances=1, max_jobs=2) as camera:
+			for _ in range(3):
+				camera.take_snapshot(self.url)
+		self.assertEqual(len(self.renderers), 2)
+		self.assertTrue(self.renderers[0].closed)
+
+	def test_TakeSnapshot_WhenTooSlow_RaisesError(self):
+		camera = self._camera(instances=1, timeout=0.05, delay=1)
+		with self.assertRaises(SnapshotTimeoutError):
+			camera.take_snapshot(self.url)
+
+	def test_TakeSnapshot_WhenTooSlow_ReplacesRenderer(self):
+		camera = self._camera(instances=1, timeout=0.05, delay=1)
+		with self.assertRaises(SnapshotTimeoutError):
+			camera.take_snapshot(self.url)
+		self.assertTrue(self.renderers[0].closed)
+		self.assertEqual(len(self.renderers), 2)
+
+	def test_TakeSnapshot_WhenTooSlow_RemovesTemporaryFile(self):
+		camera = self._camera(instances=1, timeout=0.05, delay=1)
+		with self.assertRaises(SnapshotTimeoutError):
+			camera.take_snapshot(self.url)
+		self.assertEqual(list(Path(self.tmp.name).glob('snapshot-*')), [])
+
+	def test_TakeSnapshot_WhenReplacementFailsToStart_KeepsSlot(self):
+		# A slow renderer that times out, a replacement that fails to start,
+		# then a working renderer.
+		factories = [self._factory(delay=1), None, self._factory()]
+		def factory():
+			make = factories.pop(0)
+			if make is None:
+				raise RuntimeError('browser failed to start')
+			return make()
+		camera = Camera(factory, instances=1, timeout=0.05, tmp_dir=self.tmp.name)
+		with self.assertRaises(SnapshotTimeoutError):
+			camera.take_snapshot(self.url)
+		self.assertTrue(Path(camera.take_snapshot(self.url)).exists())
+
+	def test_TakeSnapshot_WhenNoRendererFree_RaisesError(self):
+		camera = self._camera(instances=1, delay=0.5, wait_timeout=0.05)
+		busy = threading.Thread(target=camera.take_snapshot, args=(self.url,))
+		busy.start()
+		with self.assertRaises(SnapshotTimeoutError):
+			camera.take_snapshot(self.url)
+		busy.join()
+
+	def test_TakeSnapshot_WhenRendererCrashed_RaisesErrorAndRemovesFile(self):
+		camera = Camera(CrashedRenderer, instances=1, tmp_dir=self.tmp.name)
+		with self.assertRaises(RuntimeError):
+			camera.take_snapshot(self.url)
+		self.assertEqual(list(Path(self.tmp.name).glob('snapshot-*')), [])
+
+	def test_TakeSnapshot_WhenRendererCrashed_ReplacesRenderer(self):
+		crashed = CrashedRenderer()
+		renderers = [crashed, StubRenderer()]
+		camera = Camera(lambda: renderers.pop(0), instances=1, tmp_dir=self.tmp.name)
+		with self.assertRaises(RuntimeError):
+			camera.take_snapshot(self.url)
+		self.assertTrue(crashed.closed)
+		self.assertTrue(Path(camera.take_snapshot(self.url)).exists())
+
+	def test_TakeSnapshot_FromSeveralThreads_UsesEveryRenderer(self):
+		camera = self._camera(instances=2, delay=0.05)
+		threads = [threading.Thread(target=camera.take_snapshot, args=(self.url,)) for _ in range(4)]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+		self.assertEqual([r.pages_opened for r in self.renderers], [2, 2])
+
+	def test_Close_WhenCalled_ClosesRenderers(self):
+		camera = self._camera(instances=2)
+		camera.close()
+		self.assertTrue(all(r.closed for r in self.renderers))
+
+
+if __name__ == '__main__':
+	unittest.main()